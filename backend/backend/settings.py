@@ -55,6 +55,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'filemanager.access_log.AccessLogFlushMiddleware',
+    'filemanager.middleware.DirectoryListingInvalidationMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -203,6 +205,9 @@ FILE_MANAGER_ROOT = BASE_DIR / 'media/upload/'  # Root directory for all file op
 # Maximum file upload size (100MB)
 MAX_UPLOAD_SIZE = 104857600
 
+# Generate image thumbnails on a background thread after the upload response
+FILE_MANAGER_BACKGROUND_THUMBNAILS = True
+
 # OnlyOffice Document Server Configuration
 ONLYOFFICE_HOST_TYPE = 'dynamic' # 'static' or 'dynamic'
 #ONLYOFFICE_HOST = '192.168.1.101' # Only used if ONLYOFFICE_HOST_TYPE is 'static'
@@ -0,0 +1,129 @@
+"""
+Buffered writes for FileAccessLog.
+
+Views queue access log rows with enqueue_access_log() instead of inserting them
+inline. The rows are kept per thread and written with a single bulk_create once
+the response has been sent, which keeps the INSERT off the request path.
+AccessLogFlushMiddleware runs that write when the response is closed, before
+Django's request_finished handlers release the database connection.
+Rows queued outside a request (management commands, tasks) are written when
+the buffer fills up or when the process exits; the exit hook flushes the
+buffers of every thread, not just the main one.
+"""
+import atexit
+import logging
+import threading
+
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+
+from .models import FileAccessLog
+
+logger = logging.getLogger(__name__)
+
+# Number of rows written per INSERT statement when flushing
+FLUSH_BATCH_SIZE = 200
+
+# Rows held per thread before flushing early, to bound memory outside requests
+MAX_BUFFERED_ROWS = 5000
+
+_local = threading.local()
+
+# Every thread's buffer by thread ident, so the exit hook can reach them all.
+# A new thread reusing an ident picks up any rows its predecessor left behind.
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def _get_buffer():
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        with _buffers_lock:
+            buffer = _buffers.setdefault(threading.get_ident(), [])
+        _local.buffer = buffer
+    return buffer
+
+
+def _take_rows(buffer):
+    with _buffers_lock:
+        rows = buffer[:]
+        del buffer[:]
+    return rows
+
+
+def _write_rows(rows):
+    if not rows:
+        return 0
+    try:
+        FileAccessLog.objects.bulk_create(rows, batch_size=FLUSH_BATCH_SIZE)
+    except Exception as e:
+        logger.error(f'Failed to write {len(rows)} access log entries: {str(e)}')
+        return 0
+    return len(rows)
+
+
+def enqueue_access_log(**kwargs):
+    """Queue a FileAccessLog row to be written when the current request finishes"""
+    buffer = _get_buffer()
+    with _buffers_lock:
+        buffer.append(FileAccessLog(**kwargs))
+        full = len(buffer) >= MAX_BUFFERED_ROWS
+    if full:
+        flush_access_logs()
+
+
+def get_client_ip(request):
+    """Get the client IP for a request, parsed once and cached on the request"""
+    ip = getattr(request, '_filemanager_client_ip', None)
+    if ip is None:
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = x_forwarded_for.split(',')[0]
+        else:
+            ip = request.META.get('REMOTE_ADDR')
+        request._filemanager_client_ip = ip
+    return ip
+
+
+@receiver(request_started)
+def flush_leftover_access_logs(sender=None, **kwargs):
+    """Write rows left over from a response that was never closed"""
+    flush_access_logs()
+
+
+class AccessLogFlushMiddleware:
+    """Write a request's queued access log rows when its response is closed
+    
+    Response closers run before request_finished is sent, and with it Django's
+    close_old_connections, so the rows go out on the request's own connection
+    instead of reopening one after it was released.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        response = self.get_response(request)
+        response._resource_closers.append(flush_access_logs)
+        return response
+
+
+# Fallback for responses that bypassed the middleware; a no-op once it has flushed
+@receiver(request_finished)
+def flush_access_logs(sender=None, **kwargs):
+    """Write all buffered access log rows for the current thread"""
+    buffer = getattr(_local, 'buffer', None)
+    if not buffer:
+        return 0
+    return _write_rows(_take_rows(buffer))
+
+
+@atexit.register
+def flush_all_access_logs():
+    """Write the buffered access log rows of every thread, at process exit"""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+    rows = []
+    for buffer in buffers:
+        rows.extend(_take_rows(buffer))
+    return _write_rows(rows)
@@ -7,4 +7,5 @@ class FilemanagerConfig(AppConfig):
     verbose_name = 'File Manager'
     
     def ready(self):
-        import filemanager.signals
\ No newline at end of file
+        import filemanager.signals
+        import filemanager.access_log
\ No newline at end of file
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from django.db import transaction
-from filemanager.models import FileAccessPermission
+from filemanager.models import FileAccessPermission, FileItem
 import logging
 
 logger = logging.getLogger(__name__)
@@ -105,6 +105,8 @@ class Command(BaseCommand):
                     updated_count = FileAccessPermission.objects.filter(
                         id__in=batch_ids
                     ).update(is_active=False)
+                    # update() skips post_save, so invalidate cached listings explicitly
+                    FileItem.objects.mark_parents_changed([perm.file_id for perm in batch])
                     
                     deactivated_count += updated_count
                     self.stdout.write(f'Deactivated batch: {updated_count} permissions')
@@ -0,0 +1,19 @@
+"""
+Request middleware for the file manager.
+"""
+from .models import batch_children_changes
+
+
+class DirectoryListingInvalidationMiddleware:
+    """Apply the directory listing invalidations of a request together
+    
+    Signals and views only collect the affected directories while the view
+    runs; their cached listings are invalidated once, after it returns.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        with batch_children_changes():
+            return self.get_response(request)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filemanager', '0004_user_group_uuid_maps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileitem',
+            name='last_child_change_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,27 @@
+import os
+from django.conf import settings
+from django.db import migrations
+
+
+def flatten_storage_paths(apps, schema_editor):
+    """Point storage rows saved with a logical directory prefix at the flat UUID file"""
+    FileStorage = apps.get_model("filemanager", "FileStorage")
+
+    for storage in FileStorage.objects.filter(file_path__contains="/").iterator():
+        if os.path.isabs(storage.file_path):
+            continue
+        filename = os.path.basename(storage.file_path)
+        if os.path.exists(os.path.join(settings.FILE_MANAGER_ROOT, filename)):
+            storage.file_path = filename
+            storage.save(update_fields=["file_path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0005_fileitem_last_child_change_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(flatten_storage_paths, migrations.RunPython.noop),
+    ]
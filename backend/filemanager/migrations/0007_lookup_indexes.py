@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('filemanager', '0006_flatten_filestorage_paths'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fileaccesspermission',
+            index=models.Index(fields=['user', 'permission_type', 'file'], name='filemanager_user_id_a05ac4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileitem',
+            index=models.Index(fields=['parent', 'name'], name='filemanager_parent__e5679e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileitem',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['name'], name='fileitem_root_name_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_name_trigram_index(apps, schema_editor):
+    """Back name__icontains searches with a trigram index on PostgreSQL
+
+    Django compiles icontains to UPPER(name::text) LIKE UPPER(...), so the
+    index is built on that expression.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS fileitem_name_trgm_idx "
+        "ON filemanager_fileitem USING gin (UPPER(name::text) gin_trgm_ops)"
+    )
+
+
+def drop_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS fileitem_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0007_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_trigram_index, drop_name_trigram_index),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+# (index name, table, column) for every column the user and group search views match
+SEARCH_TRIGRAM_INDEXES = [
+    ("auth_user_username_trgm_idx", "auth_user", "username"),
+    ("auth_user_email_trgm_idx", "auth_user", "email"),
+    ("auth_user_first_name_trgm_idx", "auth_user", "first_name"),
+    ("auth_user_last_name_trgm_idx", "auth_user", "last_name"),
+    ("auth_group_name_trgm_idx", "auth_group", "name"),
+]
+
+
+def create_search_trigram_indexes(apps, schema_editor):
+    """Back the user and group search icontains filters with trigram indexes on PostgreSQL
+
+    Like fileitem_name_trgm_idx, the indexes are built on UPPER(column::text)
+    to match how Django compiles icontains.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index_name, table, column in SEARCH_TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)"
+        )
+
+
+def drop_search_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for index_name, _, _ in SEARCH_TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("filemanager", "0008_fileitem_name_trigram_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_trigram_indexes, drop_search_trigram_indexes),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('filemanager', '0009_user_group_search_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fileaccesslog',
+            index=models.Index(fields=['action', 'timestamp'], name='filemanager_action_5b8888_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileitem',
+            index=models.Index(fields=['is_deleted', 'owner'], name='filemanager_is_dele_6e04f2_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Mirrors FileAccessPermission.PERMISSION_PRIORITY at the time of writing
+PERMISSION_PRIORITY = {
+    "read": 1,
+    "write": 2,
+    "delete": 3,
+    "share": 4,
+    "admin": 5,
+}
+
+
+def fix_permission_priorities(apps, schema_editor):
+    """Recompute priorities of rows written by bulk sharing, which kept the default of 1"""
+    FileAccessPermission = apps.get_model("filemanager", "FileAccessPermission")
+
+    for permission_type, priority in PERMISSION_PRIORITY.items():
+        FileAccessPermission.objects.filter(permission_type=permission_type).exclude(
+            priority=priority
+        ).update(priority=priority)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("filemanager", "0010_recycle_bin_and_log_action_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_permission_priorities, migrations.RunPython.noop),
+    ]
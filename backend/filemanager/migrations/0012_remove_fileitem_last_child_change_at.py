@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filemanager', '0011_fix_bulk_permission_priorities'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='fileitem',
+            name='last_child_change_at',
+        ),
+    ]
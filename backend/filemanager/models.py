@@ -1,8 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Exists, OuterRef, Prefetch, Subquery, Count
 from django.contrib.auth.models import User, Group
 from django.utils import timezone
 import os
 import mimetypes
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import timezone as dt_timezone
 import uuid
@@ -27,7 +33,185 @@ class GroupUUIDMap(models.Model):
         return f"{self.group.name} ({self.uuid})"
 
 
-class FileItemManager(models.Manager):
+def get_user_group_ids(user):
+    """Get the ids of a user's groups, cached on the user object for the request"""
+    group_ids = getattr(user, '_filemanager_group_ids', None)
+    if group_ids is None:
+        group_ids = frozenset(user.groups.values_list('id', flat=True))
+        user._filemanager_group_ids = group_ids
+    return group_ids
+
+
+# Items held per round when walking a directory tree; also bounds each parent_id IN list
+TREE_CHUNK_SIZE = 1000
+
+# Cached directory listings embed a per-directory version kept in the cache, so a
+# stale model instance can't write an old version back. Deleting the version starts
+# a new one; unused versions simply expire.
+CHILDREN_VERSION_KEY = 'children:version:{}'
+CHILDREN_VERSION_TIMEOUT = 24 * 60 * 60
+
+_children_changes = threading.local()
+
+
+def get_children_version(directory_id):
+    """Get the version embedded in a directory's cached listings"""
+    return cache.get_or_set(
+        CHILDREN_VERSION_KEY.format(directory_id), lambda: uuid.uuid4().hex, CHILDREN_VERSION_TIMEOUT
+    )
+
+
+@contextmanager
+def batch_children_changes():
+    """Collect listing invalidations and apply them together on exit
+    
+    Wrapped around each request by DirectoryListingInvalidationMiddleware, so
+    saving many rows resolves their parents and bumps the versions once
+    rather than once per row.
+    """
+    if getattr(_children_changes, 'pending', None) is not None:
+        yield
+        return
+    
+    pending = _children_changes.pending = {'parents': set(), 'items': set()}
+    try:
+        yield
+    finally:
+        _children_changes.pending = None
+        FileItem.objects.mark_children_changed(
+            pending['parents'] | FileItem.objects._parent_ids_of(pending['items'])
+        )
+
+
+class FileItemQuerySet(models.QuerySet):
+    """Reusable query fragments for file items"""
+    
+    def visible_to(self, user):
+        """Restrict to the items ``user`` may see
+        
+        Superusers see everything and anonymous users only public items. Sharing
+        and explicit permissions are tested with EXISTS subqueries rather than
+        joins, so each item row is matched at most once and no ``.distinct()``
+        is needed.
+        """
+        if getattr(user, 'is_superuser', False):
+            return self
+        if not user.is_authenticated:
+            return self.filter(visibility='public')
+        
+        shared_with_user = FileItem.shared_users.through.objects.filter(
+            fileitem_id=OuterRef('pk'), user_id=user.id
+        )
+        user_permission = FileAccessPermission.objects.filter(
+            file=OuterRef('pk'), user=user, is_active=True
+        )
+        visible = (
+            Q(owner=user) |  # Own files
+            Q(visibility='public') |  # Public files
+            (Q(visibility='user') & Exists(shared_with_user)) |  # User shared files
+            Exists(user_permission)  # Explicit user permissions
+        )
+        
+        # Group ids are resolved once per request, so the subqueries don't join auth_user_groups
+        user_group_ids = get_user_group_ids(user)
+        if user_group_ids:
+            shared_with_group = FileItem.shared_groups.through.objects.filter(
+                fileitem_id=OuterRef('pk'), group_id__in=user_group_ids
+            )
+            group_permission = FileAccessPermission.objects.filter(
+                file=OuterRef('pk'), group_id__in=user_group_ids, is_active=True
+            )
+            visible |= (
+                (Q(visibility='group') & Exists(shared_with_group)) |  # Group shared files
+                Exists(group_permission)  # Explicit group permissions
+            )
+        return self.filter(visible)
+    
+    def iter_descendants(self, root_ids, only_directories=False, chunk_size=TREE_CHUNK_SIZE):
+        """Items below the given items, yielded in lists of at most ``chunk_size``
+        
+        The tree is walked a level at a time. Each level is fetched with
+        ``parent_id IN (...)`` lookups over at most ``chunk_size`` parents and
+        streamed with ``.iterator()``, so a tree costs about as many queries as
+        it is deep, and only one chunk of items plus the ids of the next level's
+        directories are held at once. Pass ``only_directories`` to stop at
+        directories, e.g. when only their ids are needed. Chain
+        ``.tree_fields()`` first when only ids and names are read.
+        """
+        current_level = list(root_ids)
+        while current_level:
+            next_level = []
+            for start in range(0, len(current_level), chunk_size):
+                level_items = self.filter(parent_id__in=current_level[start:start + chunk_size])
+                if only_directories:
+                    level_items = level_items.filter(item_type='directory')
+                chunk = []
+                for item in level_items.iterator(chunk_size=chunk_size):
+                    chunk.append(item)
+                    if item.item_type == 'directory':
+                        next_level.append(item.id)
+                    if len(chunk) == chunk_size:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+            current_level = next_level
+    
+    def descendants(self, root_ids, only_directories=False):
+        """All items below the given items as one list, see ``iter_descendants``"""
+        return [item for chunk in self.iter_descendants(root_ids, only_directories) for item in chunk]
+    
+    def tree_fields(self):
+        """Load only the columns needed to walk the tree
+        
+        name and parent_id are kept because the post_init signal reads them.
+        """
+        return self.only('id', 'name', 'item_type', 'parent_id')
+    
+    def with_related(self):
+        """Eager-load everything FileItemSerializer reads for each item
+        
+        User rows skip the password hash, which nothing in a listing reads.
+        """
+        active_children = FileItem.objects.filter(parent=OuterRef('pk')).order_by().values('parent')
+        return self.annotate(
+            active_children_count=Subquery(active_children.annotate(count=Count('pk')).values('count'))
+        ).select_related(
+            'owner__uuid_map', 'parent', 'storage', 'thumbnail'
+        ).defer('owner__password').prefetch_related(
+            'owner__groups__uuid_map',
+            Prefetch('shared_users', queryset=User.objects.select_related('uuid_map').defer('password')),
+            'shared_users__groups__uuid_map',
+            Prefetch('shared_groups', queryset=Group.objects.select_related('uuid_map')),
+            Prefetch('access_permissions', queryset=FileAccessPermission.objects.select_related(
+                'user', 'group'
+            ).defer('user__password')),
+            'tag_relations__tag',
+        )
+    
+    def sync_visibility_from_sharing(self):
+        """Bulk version of FileItem.update_visibility_from_sharing for these items
+        
+        Used after bulk permission writes, which skip FileAccessPermission.save().
+        Public items are left alone; the rest become 'user', 'group' or
+        'private' with one UPDATE each.
+        """
+        shared_with_users = Exists(FileAccessPermission.objects.filter(
+            file=OuterRef('pk'), user__isnull=False, is_active=True
+        )) | Exists(FileItem.shared_users.through.objects.filter(fileitem_id=OuterRef('pk')))
+        shared_with_groups = Exists(FileAccessPermission.objects.filter(
+            file=OuterRef('pk'), group__isnull=False, is_active=True
+        )) | Exists(FileItem.shared_groups.through.objects.filter(fileitem_id=OuterRef('pk')))
+        
+        items = self.exclude(visibility='public')
+        return (
+            items.filter(shared_with_users).exclude(visibility='user').update(visibility='user')
+            + items.filter(~shared_with_users & shared_with_groups).exclude(visibility='group').update(visibility='group')
+            + items.filter(~shared_with_users & ~shared_with_groups).exclude(visibility='private').update(visibility='private')
+        )
+
+
+class FileItemManager(models.Manager.from_queryset(FileItemQuerySet)):
     """Custom manager to filter out deleted items by default"""
     
     def get_queryset(self):
@@ -40,6 +224,55 @@ class FileItemManager(models.Manager):
     def deleted_only(self):
         """Only deleted items"""
         return super().get_queryset().filter(is_deleted=True)
+    
+    def mark_children_changed(self, parent_ids):
+        """Invalidate cached listings of the given directories and their parents
+        
+        A directory's own entry in its parent's listing carries its
+        children_count, so the parents' listings are invalidated as well.
+        Inside batch_children_changes() the ids are only collected.
+        """
+        parent_ids = {parent_id for parent_id in parent_ids if parent_id}
+        pending = getattr(_children_changes, 'pending', None)
+        if pending is not None:
+            pending['parents'].update(parent_ids)
+        elif parent_ids:
+            directory_ids = parent_ids | self._parent_ids_of(parent_ids)
+            keys = [CHILDREN_VERSION_KEY.format(directory_id) for directory_id in directory_ids]
+            cache.delete_many(keys)
+            # A listing rebuilt before the change commits would be cached under the
+            # new version, so drop the versions again once the change is visible
+            if transaction.get_connection().in_atomic_block:
+                transaction.on_commit(lambda: cache.delete_many(keys))
+    
+    def mark_parents_changed(self, item_ids):
+        """Invalidate cached listings of the given items' parents, e.g. after a bulk permission change
+        
+        ``item_ids`` may be a ``values_list('file_id', flat=True)`` queryset; it
+        is evaluated here, so call this before the update that would stop it
+        matching.
+        """
+        pending = getattr(_children_changes, 'pending', None)
+        if pending is not None and isinstance(item_ids, models.QuerySet):
+            pending['parents'].update(self._parent_ids_of(item_ids))
+        elif pending is not None:
+            pending['items'].update(item_ids)
+        else:
+            self.mark_children_changed(self._parent_ids_of(item_ids))
+    
+    def _parent_ids_of(self, item_ids):
+        """Parent ids of the given items, looked up in chunks of TREE_CHUNK_SIZE"""
+        queryset = super().get_queryset()
+        if isinstance(item_ids, models.QuerySet):
+            return set(queryset.filter(id__in=item_ids, parent__isnull=False).values_list('parent_id', flat=True))
+        
+        item_ids = list(item_ids)
+        parent_ids = set()
+        for start in range(0, len(item_ids), TREE_CHUNK_SIZE):
+            parent_ids.update(queryset.filter(
+                id__in=item_ids[start:start + TREE_CHUNK_SIZE], parent__isnull=False
+            ).values_list('parent_id', flat=True))
+        return parent_ids
 
 
 class FileStorage(models.Model):
@@ -65,7 +298,6 @@ class FileStorage(models.Model):
     
     def get_file_path(self):
         """Get the absolute file system path"""
-        from django.conf import settings
         return os.path.join(settings.FILE_MANAGER_ROOT, self.file_path)
     
     def calculate_checksum(self):
@@ -112,7 +344,6 @@ class FileThumbnail(models.Model):
     
     def get_thumbnail_path(self):
         """Get the absolute thumbnail file path"""
-        from django.conf import settings
         return os.path.join(settings.FILE_MANAGER_ROOT, self.thumbnail_path)
 
 
@@ -166,9 +397,12 @@ class FileItem(models.Model):
         indexes = [
             models.Index(fields=['item_type']),
             models.Index(fields=['parent']),
+            models.Index(fields=['parent', 'name']),
+            models.Index(fields=['name'], condition=Q(parent__isnull=True), name='fileitem_root_name_idx'),
             models.Index(fields=['visibility']),
             models.Index(fields=['owner']),
             models.Index(fields=['is_deleted']),
+            models.Index(fields=['is_deleted', 'owner']),
         ]
         # Note: SQLite doesn't handle NULL values in unique constraints properly
         # We'll handle uniqueness validation for both files and directories in the model's clean() method
@@ -177,9 +411,25 @@ class FileItem(models.Model):
         status = " [DELETED]" if self.is_deleted else ""
         return f"{self.name} ({self.item_type}){status}"
     
+    # Fields that belong to a particular row rather than to what it describes
+    CLONE_EXCLUDED_FIELDS = (
+        'id', 'created_at', 'updated_at',
+        'is_deleted', 'deleted_at', 'deleted_by', 'storage', 'thumbnail',
+    )
+    
+    @classmethod
+    def clone_from(cls, src, **overrides):
+        """Build an unsaved copy of src, with overrides applied on top"""
+        fields = {
+            field.attname: getattr(src, field.attname)
+            for field in cls._meta.concrete_fields
+            if field.name not in cls.CLONE_EXCLUDED_FIELDS and field.name not in overrides
+        }
+        fields.update(overrides)
+        return cls(**fields)
+    
     def clean(self):
         """Custom validation for file and directory name uniqueness"""
-        from django.core.exceptions import ValidationError
         
         # Check for duplicate names within the same parent and owner
         existing = FileItem.objects.filter(
@@ -201,6 +451,16 @@ class FileItem(models.Model):
         self.clean()
         super().save(*args, **kwargs)
     
+    def delete(self, *args, **kwargs):
+        """Delete the item and invalidate its parent's cached listings
+        
+        Done here rather than in a post_delete receiver, which would stop
+        Django from fast-deleting the rows that cascade from items.
+        """
+        result = super().delete(*args, **kwargs)
+        FileItem.objects.mark_children_changed([self.parent_id])
+        return result
+    
     def get_absolute_path(self):
         """Get the absolute file system path (internal use only)"""
         if self.storage:
@@ -208,10 +468,22 @@ class FileItem(models.Model):
         return None
     
     def get_relative_path(self):
-        """Get path relative to the root directory"""
+        """Get path relative to the root directory
+        
+        The result is memoized on the instance (and on each loaded ancestor), keyed
+        by name and parent so a rename or move of this item recomputes it.
+        """
+        cache_key = (self.parent_id, self.name)
+        cached = getattr(self, '_relative_path_cache', None)
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        
         if self.parent:
-            return os.path.join(self.parent.get_relative_path(), self.name)
-        return self.name
+            relative_path = os.path.join(self.parent.get_relative_path(), self.name)
+        else:
+            relative_path = self.name
+        self._relative_path_cache = (cache_key, relative_path)
+        return relative_path
     
     def get_display_path(self):
         """Get a safe display path (relative or just filename)"""
@@ -289,7 +561,7 @@ class FileItem(models.Model):
             return True
         
         # Owner has full access
-        if self.owner == user:
+        if self.owner_id == user.id:
             return True
         
         # Check explicit user permissions first (highest priority)
@@ -313,10 +585,12 @@ class FileItem(models.Model):
         
         elif self.visibility == 'group':
             # Check if user is in any of the shared groups
-            user_groups = user.groups.all()
-            shared_groups = self.shared_groups.all()
-            
-            if user_groups.filter(id__in=shared_groups.values_list('id', flat=True)).exists():
+            user_group_ids = get_user_group_ids(user)
+            prefetched = self._prefetched('shared_groups')
+            if prefetched is not None:
+                if any(group.id in user_group_ids for group in prefetched):
+                    return True
+            elif user_group_ids and self.shared_groups.filter(id__in=user_group_ids).exists():
                 return True
         
         # Private files - only owner can access
@@ -340,7 +614,6 @@ class FileItem(models.Model):
     
     def soft_delete(self, user):
         """Mark file as deleted (logical deletion)"""
-        from django.utils import timezone
         self.is_deleted = True
         self.deleted_at = timezone.now()
         self.deleted_by = user
@@ -383,30 +656,53 @@ class FileItem(models.Model):
         # Delete from database
         self.delete()
     
+    def _prefetched(self, relation):
+        """Return prefetched related objects, or None when not prefetched"""
+        return getattr(self, '_prefetched_objects_cache', {}).get(relation)
+    
+    def _count_related(self, relation):
+        """Count related objects, using the prefetched list when loaded"""
+        prefetched = self._prefetched(relation)
+        if prefetched is not None:
+            return len(prefetched)
+        return getattr(self, relation).count()
+    
     def get_user_permission(self, user):
         """Get the highest priority permission for a user"""
-        user_permissions = self.access_permissions.filter(
+        prefetched = self._prefetched('access_permissions')
+        if prefetched is not None:
+            candidates = [
+                permission for permission in prefetched
+                if permission.user_id == user.id and permission.group_id is None and permission.is_active
+            ]
+            return max(candidates, key=lambda permission: permission.priority, default=None)
+        
+        return self.access_permissions.filter(
             user=user, 
             group__isnull=True, 
             is_active=True
-        ).order_by('-priority')
-        
-        return user_permissions.first() if user_permissions.exists() else None
+        ).order_by('-priority').first()
     
     def get_group_permission(self, user):
         """Get best group permission for a user"""
-        user_groups = user.groups.all()
-        if not user_groups.exists():
+        user_group_ids = get_user_group_ids(user)
+        if not user_group_ids:
             return None
         
+        prefetched = self._prefetched('access_permissions')
+        if prefetched is not None:
+            candidates = [
+                permission for permission in prefetched
+                if permission.group_id in user_group_ids and permission.user_id is None and permission.is_active
+            ]
+            return max(candidates, key=lambda permission: permission.priority, default=None)
+        
         # Get the highest priority permission from user's groups
-        group_permissions = self.access_permissions.filter(
-            group__in=user_groups,
+        return self.access_permissions.filter(
+            group_id__in=user_group_ids,
             user__isnull=True,
             is_active=True
-        ).order_by('-priority')
-        
-        return group_permissions.first() if group_permissions.exists() else None
+        ).order_by('-priority').first()
     
     def get_effective_permissions(self, user):
         """Get all effective permissions for a user"""
@@ -416,7 +712,7 @@ class FileItem(models.Model):
             permissions.update(['read', 'write', 'delete', 'share', 'admin'])
             return permissions
         
-        if self.owner == user:
+        if self.owner_id == user.id:
             permissions.update(['read', 'write', 'delete', 'share', 'admin'])
             return permissions
         
@@ -483,17 +779,17 @@ class FileItem(models.Model):
             'has_explicit_permissions': False,
             'user_permissions_count': 0,
             'group_permissions_count': 0,
-            'shared_users_count': self.shared_users.count(),
-            'shared_groups_count': self.shared_groups.count(),
+            'shared_users_count': self._count_related('shared_users'),
+            'shared_groups_count': self._count_related('shared_groups'),
         }
         
-        # Count explicit permissions
-        user_perms = self.access_permissions.filter(user__isnull=False, is_active=True)
-        group_perms = self.access_permissions.filter(group__isnull=False, is_active=True)
-        
-        status['user_permissions_count'] = user_perms.count()
-        status['group_permissions_count'] = group_perms.count()
-        status['has_explicit_permissions'] = user_perms.exists() or group_perms.exists()
+        # Count explicit permissions (from one query, or the prefetched list)
+        active_permissions = [permission for permission in self.access_permissions.all() if permission.is_active]
+        status['user_permissions_count'] = sum(1 for permission in active_permissions if permission.user_id is not None)
+        status['group_permissions_count'] = sum(1 for permission in active_permissions if permission.group_id is not None)
+        status['has_explicit_permissions'] = bool(
+            status['user_permissions_count'] or status['group_permissions_count']
+        )
         
         return status
 
@@ -534,6 +830,7 @@ class FileAccessPermission(models.Model):
         indexes = [
             models.Index(fields=['file', 'user', 'permission_type']),
             models.Index(fields=['file', 'group', 'permission_type']),
+            models.Index(fields=['user', 'permission_type', 'file']),
             models.Index(fields=['expires_at', 'is_active']),
             models.Index(fields=['priority']),
         ]
@@ -602,6 +899,7 @@ class FileAccessPermission(models.Model):
         # Update file visibility after permission deletion
         if file_item:
             file_item.update_visibility_from_sharing()
+            FileItem.objects.mark_children_changed([file_item.parent_id])
 
 
 class FileTag(models.Model):
@@ -614,6 +912,19 @@ class FileTag(models.Model):
         return self.name
 
 
+TAG_LIST_VERSION_KEY = 'filetags:version'
+
+
+def get_tag_list_version():
+    """Get the version embedded in cached tag listings"""
+    return cache.get_or_set(TAG_LIST_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+def bump_tag_list_version():
+    """Invalidate cached tag listings after tags are added, changed or removed"""
+    cache.set(TAG_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
 class FileTagRelation(models.Model):
     """Many-to-many relationship between files and tags"""
     file = models.ForeignKey(FileItem, on_delete=models.CASCADE, related_name='tag_relations')
@@ -622,6 +933,12 @@ class FileTagRelation(models.Model):
     
     class Meta:
         unique_together = ['file', 'tag']
+    
+    def delete(self, *args, **kwargs):
+        """Delete the relation and invalidate its file's parent listings, see FileItem.delete()"""
+        result = super().delete(*args, **kwargs)
+        FileItem.objects.mark_parents_changed([self.file_id])
+        return result
 
 
 class FileAccessLog(models.Model):
@@ -651,6 +968,7 @@ class FileAccessLog(models.Model):
         indexes = [
             models.Index(fields=['file', 'timestamp']),
             models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['action', 'timestamp']),
         ]
 
 
@@ -7,6 +7,7 @@ import hmac
 import json
 import time
 import jwt
+import logging
 from urllib.parse import urljoin
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -21,6 +22,8 @@ from rest_framework import status
 import requests
 from .models import FileItem
 
+logger = logging.getLogger(__name__)
+
 
 # OnlyOffice Document Server Configuration
 SECRET_KEY = getattr(settings, 'ONLYOFFICE_SECRET_KEY', None)
@@ -320,26 +323,24 @@ def office_download(request, file_id):
             }
             content_type = content_types.get(ext, 'application/octet-stream')
         
-        print(f"Content type: {content_type}")
+        logger.debug('Content type: %s', content_type)
         
         # Return file content
         response = HttpResponse(file_content, content_type=content_type)
         response['Content-Disposition'] = f'attachment; filename="{file_item.name}"'
         response['Content-Length'] = len(file_content)
         
-        print("Returning file response")
+        logger.debug('Returning file response')
         return response
         
     except FileItem.DoesNotExist:
-        print(f"FileItem with id {file_id} does not exist")
+        logger.warning('FileItem with id %s does not exist', file_id)
         return Response(
             {'error': 'File not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
     except Exception as e:
-        print(f"Error in office_download: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in office_download')
         return Response(
             {'error': f'Failed to download file: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -400,7 +401,7 @@ def office_upload(request, file_id):
         # Note: We can't set modifier since this is called by OnlyOffice, not a user
         file_item.save()
         
-        print(f"File {file_id} uploaded successfully from OnlyOffice")
+        logger.info('File %s uploaded successfully from OnlyOffice', file_id)
         
         return Response({
             'status': 'success',
@@ -413,7 +414,7 @@ def office_upload(request, file_id):
             status=status.HTTP_404_NOT_FOUND
         )
     except Exception as e:
-        print(f"Error uploading file {file_id}: {str(e)}")
+        logger.exception('Error uploading file %s', file_id)
         return Response(
             {'error': f'Failed to upload file: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -437,7 +438,7 @@ def document_callback(request):
         # Parse the callback data
         callback_data = json.loads(request.body.decode('utf-8'))
 
-        print(f"Document callback received: {callback_data}")
+        logger.debug('Document callback received: %s', callback_data)
         
         # Verify the signature if provided
         if 'signature' in callback_data and SECRET_KEY:
@@ -477,7 +478,7 @@ def document_callback(request):
                                 if changes:
                                     user_info = changes[-1].get('user')
                             except (KeyError, IndexError, AttributeError) as e:
-                                print(f"Could not extract user info from callback data: {e}")
+                                logger.warning('Could not extract user info from callback data: %s', e)
                             
                             # Update file metadata
                             file_item.updated_at = timezone.now()
@@ -494,32 +495,32 @@ def document_callback(request):
                                         from django.contrib.auth.models import User
                                         modifier = User.objects.get(id=user_id)
                                         file_item.modifier = modifier
-                                        print(f"Updated modifier to user {user_name} (ID: {user_id})")
+                                        logger.debug('Updated modifier to user %s (ID: %s)', user_name, user_id)
                                     except (ValueError, TypeError) as e:
-                                        print(f"Invalid user ID format '{user_id_str}': {e}")
+                                        logger.warning("Invalid user ID format '%s': %s", user_id_str, e)
                                     except User.DoesNotExist:
-                                        print(f"User with ID {user_id} not found, keeping current modifier")
+                                        logger.warning('User with ID %s not found, keeping current modifier', user_id)
                                 else:
-                                    print("No user ID found in callback data")
+                                    logger.debug('No user ID found in callback data')
                             else:
-                                print("No user information available in callback data")
+                                logger.debug('No user information available in callback data')
                             
                             file_item.save()
                             
-                            print(f"File {file_id} updated successfully for status code {status_code}")
+                            logger.info('File %s updated successfully for status code %s', file_id, status_code)
                         else:
-                            print(f"Failed to download updated document for file {file_id}, status: {response.status_code}")
+                            logger.error('Failed to download updated document for file %s, status: %s', file_id, response.status_code)
                             if response.text:
-                                print(f"Response content: {response.text}")
+                                logger.error('Response content: %s', response.text)
                     else:
-                        print(f"No download URL provided for file {file_id} with status code {status_code}")
+                        logger.warning('No download URL provided for file %s with status code %s', file_id, status_code)
                             
                 except FileItem.DoesNotExist:
-                    print(f"FileItem with id {file_id} does not exist for status code {status_code}")
+                    logger.warning('FileItem with id %s does not exist for status code %s', file_id, status_code)
                 except Exception as e:
-                    print(f"Error updating file {file_id} for status code {status_code}: {e}")
+                    logger.exception('Error updating file %s for status code %s', file_id, status_code)
             else:
-                print(f"No valid file_id found in callback data for status code {status_code}")
+                logger.warning('No valid file_id found in callback data for status code %s', status_code)
         
         else:
             # Log other status codes without updating files
@@ -534,15 +535,15 @@ def document_callback(request):
             }
             
             status_message = status_messages.get(status_code, f"Unknown status code: {status_code}")
-            print(f"Document callback status {status_code}: {status_message}")
-            print(f"Callback data: {callback_data}")
+            logger.debug('Document callback status %s: %s', status_code, status_message)
+            logger.debug('Callback data: %s', callback_data)
         
         return JsonResponse({'error': 0})
         
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
-        print(f"Callback error: {e}")
+        logger.exception('Callback error')
         return JsonResponse({'error': str(e)}, status=500)
 
 
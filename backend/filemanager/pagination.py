@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 from math import ceil
 
@@ -70,12 +70,36 @@ class FileItemPagination(EnhancedPageNumberPagination):
     max_page_size = 500
 
 
-class FileAccessLogPagination(EnhancedPageNumberPagination):
+class FileAccessLogPagination(CursorPagination):
     """
-    Pagination for FileAccessLog with larger page size for logs
+    Cursor pagination for FileAccessLog, newest first. Pages seek on the
+    timestamp instead of counting past earlier rows, so deep pages cost the
+    same as the first one.
     """
     page_size = 100
+    page_size_query_param = 'page_size'
     max_page_size = 1000
+    ordering = ('-timestamp', '-id')
+    
+    def get_paginated_response(self, data):
+        """
+        Return the same envelope as the page number paginators, without counts
+        """
+        next_url = self.get_next_link()
+        previous_url = self.get_previous_link()
+        
+        pagination_data = {
+            'next': next_url,
+            'previous': previous_url,
+            'page_size': self.page_size,
+            'has_next': next_url is not None,
+            'has_previous': previous_url is not None,
+        }
+        
+        return Response({
+            'pagination': pagination_data,
+            'results': data
+        })
 
 
 class FileTagPagination(EnhancedPageNumberPagination):
@@ -84,3 +108,18 @@ class FileTagPagination(EnhancedPageNumberPagination):
     """
     page_size = 50
     max_page_size = 200
+
+
+class DeletedFilesPagination(EnhancedPageNumberPagination):
+    """
+    Pagination for the recycle bin, applied only when a page is requested
+    so clients that expect the full listing keep working
+    """
+    page_size = 50
+    max_page_size = 500
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.page_query_param not in request.query_params
+                and self.page_size_query_param not in request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
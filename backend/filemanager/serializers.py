@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     FileItem, FileStorage, FileThumbnail, FileTag, FileTagRelation,
     FileAccessLog, FileAccessPermission, FilePermissionRequest,
-    UserUUIDMap, GroupUUIDMap
+    UserUUIDMap, GroupUUIDMap, get_user_group_ids
 )
 from django.contrib.auth.models import User, Group
 from django.db import models
@@ -10,6 +10,10 @@ from django.utils import timezone
 from pathlib import Path
 
 
+# Most file ids a single batch request (operations, restore, hard delete) may name
+MAX_BATCH_FILE_IDS = 1000
+
+
 class PaginationSerializer(serializers.Serializer):
     """Serializer for pagination metadata"""
     count = serializers.IntegerField(help_text="Total number of items")
@@ -31,8 +35,12 @@ class GroupSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'members']
 
     def get_id(self, obj):
-        mapping, _ = GroupUUIDMap.objects.get_or_create(group=obj)
-        return str(mapping.uuid)
+        # Use the mapping loaded via select_related('uuid_map') when available
+        try:
+            return str(obj.uuid_map.uuid)
+        except GroupUUIDMap.DoesNotExist:
+            mapping, _ = GroupUUIDMap.objects.get_or_create(group=obj)
+            return str(mapping.uuid)
     
     def get_members(self, obj):
         try:
@@ -52,8 +60,12 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'groups']
 
     def get_id(self, obj):
-        mapping, _ = UserUUIDMap.objects.get_or_create(user=obj)
-        return str(mapping.uuid)
+        # Use the mapping loaded via select_related('uuid_map') when available
+        try:
+            return str(obj.uuid_map.uuid)
+        except UserUUIDMap.DoesNotExist:
+            mapping, _ = UserUUIDMap.objects.get_or_create(user=obj)
+            return str(mapping.uuid)
 
 
 class UserCreateUpdateSerializer(serializers.ModelSerializer):
@@ -217,7 +229,7 @@ class FileItemSerializer(serializers.ModelSerializer):
             return []
         
         # Only show breadcrumb for user's own files to avoid exposing others' directory structure
-        if obj.owner != request.user:
+        if obj.owner_id != request.user.id:
             return []
         
         parents = []
@@ -233,6 +245,9 @@ class FileItemSerializer(serializers.ModelSerializer):
     
     def get_children_count(self, obj):
         if obj.item_type == 'directory':
+            # Annotated by FileItemQuerySet.with_related()
+            if hasattr(obj, 'active_children_count'):
+                return obj.active_children_count or 0
             return obj.get_children().count()
         return 0
     
@@ -254,14 +269,23 @@ class FileItemSerializer(serializers.ModelSerializer):
         """Get current user's permissions for this file"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            permissions = FileAccessPermission.objects.filter(
-                file=obj,
-                is_active=True,
-                expires_at__isnull=True
-            ).filter(
-                models.Q(user=request.user) | 
-                models.Q(group__in=request.user.groups.all())
-            )
+            prefetched = obj._prefetched('access_permissions')
+            if prefetched is not None:
+                user_group_ids = get_user_group_ids(request.user)
+                permissions = [
+                    perm for perm in prefetched
+                    if perm.is_active and perm.expires_at is None
+                    and (perm.user_id == request.user.id or perm.group_id in user_group_ids)
+                ]
+            else:
+                permissions = FileAccessPermission.objects.filter(
+                    file=obj,
+                    is_active=True,
+                    expires_at__isnull=True
+                ).filter(
+                    models.Q(user=request.user) | 
+                    models.Q(group_id__in=get_user_group_ids(request.user))
+                )
             return [perm.permission_type for perm in permissions if perm.is_valid()]
         return []
     
@@ -343,7 +367,7 @@ class FileItemSerializer(serializers.ModelSerializer):
         
         # Only show parent field for user's own files to avoid exposing others' directory structure
         request = self.context.get('request')
-        if request and request.user.is_authenticated and instance.owner != request.user:
+        if request and request.user.is_authenticated and instance.owner_id != request.user.id:
             data['parent'] = None
         
         return data
@@ -551,7 +575,10 @@ class FileUploadSerializer(serializers.Serializer):
 class FileOperationSerializer(serializers.Serializer):
     """Serializer for file operations (copy, move, delete)"""
     operation = serializers.ChoiceField(choices=['copy', 'move', 'delete'])
-    file_ids = serializers.ListField(child=serializers.UUIDField(), help_text="List of file IDs to operate on")
+    file_ids = serializers.ListField(
+        child=serializers.UUIDField(), max_length=MAX_BATCH_FILE_IDS,
+        help_text="List of file IDs to operate on"
+    )
     destination_id = serializers.UUIDField(required=False, help_text="ID of destination directory for copy/move operations")
     
     def validate(self, data):
@@ -575,12 +602,18 @@ class DeletedFileSerializer(serializers.ModelSerializer):
 
 class FileRestoreSerializer(serializers.Serializer):
     """Serializer for restoring deleted files"""
-    file_ids = serializers.ListField(child=serializers.UUIDField(), help_text="List of deleted file IDs to restore")
+    file_ids = serializers.ListField(
+        child=serializers.UUIDField(), max_length=MAX_BATCH_FILE_IDS,
+        help_text="List of deleted file IDs to restore"
+    )
 
 
 class FileHardDeleteSerializer(serializers.Serializer):
     """Serializer for permanently deleting files"""
-    file_ids = serializers.ListField(child=serializers.UUIDField(), help_text="List of deleted file IDs to permanently delete")
+    file_ids = serializers.ListField(
+        child=serializers.UUIDField(), max_length=MAX_BATCH_FILE_IDS,
+        help_text="List of deleted file IDs to permanently delete"
+    )
 
 
 class FilePermissionRequestSerializer(serializers.ModelSerializer):
@@ -1,10 +1,13 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete, post_init, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
 from django.contrib.auth.models import User, Group
-from .models import FileAccessPermission, UserUUIDMap, GroupUUIDMap
+from .models import (
+    FileItem, FileStorage, FileAccessPermission, FileTag, FileTagRelation, UserUUIDMap, GroupUUIDMap,
+    bump_tag_list_version
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -65,10 +68,82 @@ def cleanup_old_inactive_permissions(days=90, batch_size=100):
 def log_permission_deletion(sender, instance, **kwargs):
     """
     Log when permissions are permanently deleted for audit purposes.
+    
+    Only ids are logged: loading the related rows here would cost queries for
+    every permission cascading from a deleted item.
     """
-    target = instance.user.username if instance.user else instance.group.name
+    target = f'user {instance.user_id}' if instance.user_id else f'group {instance.group_id}'
     logger.info(
-        f'Permission permanently deleted: {instance.file.name} -> {target} '
-        f'({instance.permission_type}) granted by {instance.granted_by.username} '
+        f'Permission permanently deleted: file {instance.file_id} -> {target} '
+        f'({instance.permission_type}) granted by user {instance.granted_by_id} '
         f'on {instance.granted_at.strftime("%Y-%m-%d %H:%M:%S")}'
     )
+
+
+def _descendant_directory_ids(directory_id):
+    """Collect a directory and all directories below it, one query per level."""
+    descendants = FileItem.objects.with_deleted().tree_fields().descendants([directory_id], only_directories=True)
+    return [directory_id] + [directory.id for directory in descendants]
+
+
+@receiver(post_init, sender=FileItem)
+def remember_loaded_location(sender, instance, **kwargs):
+    """Remember the name and parent an item was loaded with to detect renames and moves.
+    
+    Deferred fields are left as None, which later counts as changed; reading
+    them here would load them, creating another instance and recursing.
+    """
+    instance._loaded_parent_id = instance.__dict__.get('parent_id')
+    instance._loaded_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=FileItem)
+def mark_parent_changed_on_save(sender, instance, created, **kwargs):
+    """Invalidate cached listings of the item's old and new parent directories.
+    
+    Renaming or moving a directory also changes the breadcrumbs of everything
+    below it, so listings of all its descendant directories are invalidated too.
+    """
+    changed_ids = [instance.parent_id, instance._loaded_parent_id]
+    moved_or_renamed = (
+        instance.parent_id != instance._loaded_parent_id or instance.name != instance._loaded_name
+    )
+    if not created and instance.item_type == 'directory' and moved_or_renamed:
+        changed_ids.extend(_descendant_directory_ids(instance.id))
+    FileItem.objects.mark_children_changed(changed_ids)
+    
+    instance._loaded_parent_id = instance.parent_id
+    instance._loaded_name = instance.name
+
+
+@receiver(m2m_changed, sender=FileItem.shared_users.through)
+@receiver(m2m_changed, sender=FileItem.shared_groups.through)
+def mark_parent_changed_on_sharing(sender, instance, action, **kwargs):
+    """Invalidate cached listings when an item's shared users or groups change."""
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, FileItem):
+        FileItem.objects.mark_children_changed([instance.parent_id])
+
+
+# Deletes are handled by the models' delete() methods, so that cascades stay fast deletes
+@receiver(post_save, sender=FileAccessPermission)
+@receiver(post_save, sender=FileTagRelation)
+def mark_parent_changed_on_file_relation(sender, instance, **kwargs):
+    """Invalidate cached listings when a child's permissions or tags change."""
+    FileItem.objects.mark_parents_changed([instance.file_id])
+
+
+@receiver(post_save, sender=FileStorage)
+def mark_parent_changed_on_storage(sender, instance, created, **kwargs):
+    """Invalidate cached listings when a child's file metadata changes."""
+    if not created:
+        parent_id = FileItem.objects.with_deleted().filter(
+            storage=instance
+        ).values_list('parent_id', flat=True).first()
+        FileItem.objects.mark_children_changed([parent_id])
+
+
+@receiver(post_save, sender=FileTag)
+@receiver(post_delete, sender=FileTag)
+def invalidate_tag_list_cache(sender, instance, **kwargs):
+    """Invalidate cached tag listings when a tag is added, changed or removed."""
+    bump_tag_list_version()
@@ -2,7 +2,7 @@ from celery import shared_task
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
-from .models import FileAccessPermission
+from .models import FileAccessPermission, FileItem
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,6 +29,8 @@ def cleanup_expired_permissions():
     
     try:
         with transaction.atomic():
+            # update() skips post_save, so invalidate cached listings explicitly
+            FileItem.objects.mark_parents_changed(expired_permissions.values('file_id'))
             deactivated_count = expired_permissions.update(is_active=False)
         
         logger.info(f'Deactivated {deactivated_count} expired permissions')
@@ -62,11 +64,10 @@ def cleanup_old_inactive_permissions(days=90, batch_size=1000):
         with transaction.atomic():
             # Delete in batches to avoid memory issues
             while True:
-                batch = list(old_permissions[:batch_size])
-                if not batch:
+                batch_ids = list(old_permissions.values_list('id', flat=True)[:batch_size])
+                if not batch_ids:
                     break
                 
-                batch_ids = [perm.id for perm in batch]
                 deleted_batch = FileAccessPermission.objects.filter(
                     id__in=batch_ids
                 ).delete()
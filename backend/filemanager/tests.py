@@ -1,11 +1,25 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
-from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User, Group
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import FileItem, FileStorage
+from .models import FileItem, FileStorage, FileAccessPermission, FileAccessLog, FileTag, batch_children_changes
+from .access_log import enqueue_access_log, flush_access_logs, flush_all_access_logs
+from .serializers import MAX_BATCH_FILE_IDS
+from .utils import copy_file_fast
+from .views import FileUploadView
+import hashlib
+import io
+import uuid
 import tempfile
+import threading
 import os
+from unittest.mock import patch
 
 
 class FileStreamingTestCase(APITestCase):
@@ -41,6 +55,8 @@ class FileStreamingTestCase(APITestCase):
     
     def tearDown(self):
         """Clean up test data"""
+        # Write rows of streams whose body was never read, while their items still exist
+        flush_all_access_logs()
         os.unlink(self.temp_file.name)
     
     def test_stream_file_success(self):
@@ -63,6 +79,44 @@ class FileStreamingTestCase(APITestCase):
         self.assertIn('Content-Range', response)
         self.assertEqual(response['Accept-Ranges'], 'bytes')
     
+    def test_stream_file_logs_access(self):
+        """Test the buffered access log is written once the response is finished"""
+        url = reverse('fileitem-stream', kwargs={'pk': self.file_item.pk})
+        response = self.client.get(url)
+        b''.join(response.streaming_content)
+        
+        self.assertEqual(
+            FileAccessLog.objects.filter(file=self.file_item, action='stream').count(), 1
+        )
+    
+    def test_access_log_flushed_before_request_finished(self):
+        """Test the middleware writes the log on response close, not in request_finished"""
+        url = reverse('fileitem-stream', kwargs={'pk': self.file_item.pk})
+        request_finished.disconnect(flush_access_logs)
+        try:
+            response = self.client.get(url)
+            b''.join(response.streaming_content)
+        finally:
+            request_finished.connect(flush_access_logs)
+        
+        self.assertEqual(
+            FileAccessLog.objects.filter(file=self.file_item, action='stream').count(), 1
+        )
+    
+    def test_exit_flush_writes_rows_queued_on_other_threads(self):
+        """Test rows left in a worker thread's buffer are written by the exit hook"""
+        worker = threading.Thread(
+            target=enqueue_access_log,
+            kwargs={'file': self.file_item, 'user': self.user, 'action': 'view'}
+        )
+        worker.start()
+        worker.join()
+        
+        self.assertEqual(flush_all_access_logs(), 1)
+        self.assertEqual(
+            FileAccessLog.objects.filter(file=self.file_item, action='view').count(), 1
+        )
+    
     def test_stream_file_unauthorized(self):
         """Test streaming file without authentication"""
         self.client.logout()
@@ -93,3 +147,909 @@ class FileStreamingTestCase(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('Item is not a file', response.data['error'])
+
+    
+    def test_download_disposition(self):
+        """Test previewable files are served inline unless a download is forced"""
+        url = reverse('fileitem-download', kwargs={'pk': self.file_item.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="test_video.mp4"')
+        self.assertEqual(b''.join(response.streaming_content), b'Test video content for streaming')
+        
+        response = self.client.get(url, {'download': 'true'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="test_video.mp4"')
+    
+    def test_download_unreadable_path_returns_error_response(self):
+        """Test an OSError other than a missing file is reported as a JSON error"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        FileStorage.objects.filter(pk=self.file_storage.pk).update(file_path=directory)
+        
+        url = reverse('fileitem-download', kwargs={'pk': self.file_item.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn('error', response.data)
+
+
+class FileVisibilityFilterTestCase(APITestCase):
+    def setUp(self):
+        """Set up users, groups and items with different visibility"""
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.user = User.objects.create_user(username='viewer', password='testpass123')
+        self.group_a = Group.objects.create(name='group_a')
+        self.group_b = Group.objects.create(name='group_b')
+        self.user.groups.add(self.group_a, self.group_b)
+        
+        self.private = FileItem.objects.create(
+            name='private', item_type='directory', owner=self.owner, visibility='private'
+        )
+        self.public = FileItem.objects.create(
+            name='public', item_type='directory', owner=self.owner, visibility='public'
+        )
+        self.user_shared = FileItem.objects.create(
+            name='user_shared', item_type='directory', owner=self.owner, visibility='user'
+        )
+        self.user_shared.shared_users.add(self.user)
+        self.group_shared = FileItem.objects.create(
+            name='group_shared', item_type='directory', owner=self.owner, visibility='group'
+        )
+        # Shared with both of the user's groups - must still be listed once
+        self.group_shared.shared_groups.add(self.group_a, self.group_b)
+        self.permitted = FileItem.objects.create(
+            name='permitted', item_type='directory', owner=self.owner, visibility='private'
+        )
+        FileAccessPermission.objects.create(
+            file=self.permitted, user=self.user, permission_type='read', granted_by=self.owner
+        )
+        self.own = FileItem.objects.create(
+            name='own', item_type='directory', owner=self.user, visibility='private'
+        )
+        
+        self.client.force_authenticate(user=self.user)
+    
+    def test_list_children_visibility(self):
+        """Test root listing only returns items visible to the user, without duplicates"""
+        url = reverse('fileitem-list-children')
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [item['name'] for item in response.data['children']]
+        self.assertEqual(
+            sorted(names),
+            ['group_shared', 'own', 'permitted', 'public', 'user_shared']
+        )
+    
+    def test_root_listing_includes_orphaned_shared_items(self):
+        """Test items shared from inside a hidden directory are listed at the root"""
+        nested = FileItem.objects.create(
+            name='nested', item_type='directory', owner=self.owner, parent=self.private, visibility='user'
+        )
+        nested.shared_users.add(self.user)
+        FileItem.objects.create(
+            name='nested_public', item_type='directory', owner=self.owner, parent=self.public, visibility='public'
+        )
+        
+        response = self.client.get(reverse('fileitem-list-children'))
+        names = [item['name'] for item in response.data['children']]
+        self.assertIn('nested', names)
+        self.assertNotIn('nested_public', names)
+        self.assertEqual(response.data['orphaned_shared_count'], 1)
+
+
+class DirectoryListingCacheTestCase(APITestCase):
+    def setUp(self):
+        """Set up a directory owned by the test user"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.directory = FileItem.objects.create(
+            name='docs', item_type='directory', owner=self.user
+        )
+        self.url = reverse('fileitem-list-children')
+    
+    def _list_names(self):
+        response = self.client.get(self.url, {'parent_id': str(self.directory.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.data['children']]
+    
+    def test_listing_invalidated_on_child_changes(self):
+        """Test cached listings are refreshed when children are added, renamed or moved"""
+        self.assertEqual(self._list_names(), [])
+        
+        child = FileItem.objects.create(
+            name='a', item_type='directory', parent=self.directory, owner=self.user
+        )
+        self.assertEqual(self._list_names(), ['a'])
+        
+        child.name = 'b'
+        child.save()
+        self.assertEqual(self._list_names(), ['b'])
+        
+        child.parent = None
+        child.save()
+        self.assertEqual(self._list_names(), [])
+    
+    def test_listing_refreshes_subdirectory_children_count(self):
+        """Test a grandchild change refreshes the subdirectory's children_count"""
+        child = FileItem.objects.create(
+            name='x', item_type='directory', parent=self.directory, owner=self.user
+        )
+        self._list_names()
+        
+        FileItem.objects.create(name='y', item_type='directory', parent=child, owner=self.user)
+        response = self.client.get(self.url, {'parent_id': str(self.directory.id)})
+        self.assertEqual([item['children_count'] for item in response.data['children']], [1])
+    
+    def test_stale_directory_save_keeps_listing_fresh(self):
+        """Test saving a directory loaded before a child change doesn't bring back the old listing"""
+        stale = FileItem.objects.get(pk=self.directory.pk)
+        self.assertEqual(self._list_names(), [])
+        
+        FileItem.objects.create(name='a', item_type='directory', parent=self.directory, owner=self.user)
+        stale.name = 'renamed'
+        stale.save()
+        self.assertEqual(self._list_names(), ['a'])
+    
+    def test_batched_changes_invalidate_once(self):
+        """Test changes inside a batch look up parents once, on exit"""
+        with CaptureQueriesContext(connection) as queries:
+            with batch_children_changes():
+                for name in ('a', 'b', 'c'):
+                    FileItem.objects.create(name=name, item_type='directory', parent=self.directory, owner=self.user)
+        parent_lookups = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "filemanager_fileitem"."parent_id"')
+        ]
+        self.assertEqual(len(parent_lookups), 1)
+        self.assertEqual(self._list_names(), ['a', 'b', 'c'])
+    
+    @override_settings(ALLOWED_HOSTS=['hosta.example', 'hostb.example'])
+    def test_listing_cached_per_host(self):
+        """Test absolute URLs cached for one host aren't served to clients of another"""
+        storage = FileStorage.objects.create(file_path='missing.txt', file_size=0)
+        FileItem.objects.create(
+            name='a.txt', item_type='file', parent=self.directory, owner=self.user, storage=storage
+        )
+        for host in ('hosta.example', 'hostb.example'):
+            response = self.client.get(self.url, {'parent_id': str(self.directory.id)}, HTTP_HOST=host)
+            self.assertTrue(response.data['children'][0]['url'].startswith(f'http://{host}/'))
+    
+    def test_listing_refreshed_after_bulk_permission_expiry(self):
+        """Test deactivating expired grants in bulk drops the item from the grantee's listing"""
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.utils import timezone
+        
+        grantee = User.objects.create_user(username='grantee', password='testpass123')
+        child = FileItem.objects.create(
+            name='shared', item_type='directory', parent=self.directory, owner=self.user
+        )
+        for item in (self.directory, child):
+            FileAccessPermission.objects.create(
+                file=item, user=grantee, permission_type='read', granted_by=self.user,
+                expires_at=timezone.now() + timedelta(hours=1)
+            )
+        self.client.force_authenticate(user=grantee)
+        self.assertEqual(self._list_names(), ['shared'])
+        
+        FileAccessPermission.objects.filter(file=child).update(expires_at=timezone.now() - timedelta(hours=1))
+        call_command('cleanup_expired_permissions', force=True, stdout=io.StringIO())
+        self.assertEqual(self._list_names(), [])
+
+
+class FileUploadTestCase(APITestCase):
+    def setUp(self):
+        """Set up an authenticated user"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('file-upload')
+    
+    def test_upload_with_tags(self):
+        """Test upload stores the file and attaches tags, including existing ones"""
+        FileTag.objects.create(name='existing')
+        upload = SimpleUploadedFile('notes.txt', b'hello world', content_type='text/plain')
+        
+        response = self.client.post(
+            self.url, {'file': upload, 'tags': ['existing', 'new', 'new']}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        file_item = FileItem.objects.get(id=response.data['id'])
+        self.addCleanup(os.remove, file_item.storage.get_file_path())
+        self.assertEqual(file_item.storage.checksum, hashlib.sha256(b'hello world').hexdigest())
+        self.assertEqual(
+            sorted(file_item.tag_relations.values_list('tag__name', flat=True)), ['existing', 'new']
+        )
+    
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_upload_from_temporary_file_checksum(self):
+        """Test uploads spooled to disk are moved into storage with their checksum"""
+        content = b'spooled to disk' * 1000
+        upload = SimpleUploadedFile('large.bin', content, content_type='application/octet-stream')
+        
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        file_item = FileItem.objects.get(id=response.data['id'])
+        self.addCleanup(os.remove, file_item.storage.get_file_path())
+        self.assertEqual(file_item.storage.checksum, hashlib.sha256(content).hexdigest())
+        self.assertEqual(file_item.storage.calculate_checksum(), file_item.storage.checksum)
+    
+    @override_settings(FILE_MANAGER_BACKGROUND_THUMBNAILS=False)
+    def test_upload_image_thumbnail(self):
+        """Test an uploaded JPEG gets a thumbnail that keeps its aspect ratio"""
+        from PIL import Image
+        
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+        upload = SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        file_item = FileItem.objects.get(id=response.data['id'])
+        self.addCleanup(os.remove, file_item.storage.get_file_path())
+        self.assertIsNotNone(file_item.thumbnail)
+        self.addCleanup(os.remove, file_item.thumbnail.get_thumbnail_path())
+        self.assertEqual((file_item.thumbnail.width, file_item.thumbnail.height), (150, 100))
+    
+    def test_upload_shared_with_users(self):
+        """Test an upload shared with users gets exactly those users"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        upload = SimpleUploadedFile('shared.txt', b'data', content_type='text/plain')
+        
+        response = self.client.post(self.url, {
+            'file': upload,
+            'visibility': 'user',
+            'shared_users': [str(other.uuid_map.uuid), str(other.uuid_map.uuid)],
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        file_item = FileItem.objects.get(id=response.data['id'])
+        self.addCleanup(os.remove, file_item.storage.get_file_path())
+        self.assertEqual(file_item.visibility, 'user')
+        self.assertEqual(list(file_item.shared_users.all()), [other])
+    
+    def test_upload_reuses_existing_directory_path(self):
+        """Test uploads with a relative path reuse directories created earlier"""
+        for filename in ('one.txt', 'two.txt'):
+            upload = SimpleUploadedFile(filename, b'data', content_type='text/plain')
+            response = self.client.post(
+                self.url, {'file': upload, 'relative_path': 'a/b'}, format='multipart'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            file_item = FileItem.objects.get(id=response.data['id'])
+            self.addCleanup(os.remove, file_item.storage.get_file_path())
+        
+        self.assertEqual(FileItem.objects.filter(item_type='directory').count(), 2)
+        leaf = FileItem.objects.get(name='b', item_type='directory')
+        self.assertEqual(leaf.parent.name, 'a')
+        self.assertEqual(sorted(leaf.children.values_list('name', flat=True)), ['one.txt', 'two.txt'])
+    
+    def test_upload_extends_existing_directory_path(self):
+        """Test a deeper relative path only creates the missing tail directories"""
+        for relative_path in ('a', 'a/b/c'):
+            upload = SimpleUploadedFile('file.txt', b'data', content_type='text/plain')
+            response = self.client.post(
+                self.url, {'file': upload, 'relative_path': relative_path}, format='multipart'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            file_item = FileItem.objects.get(id=response.data['id'])
+            self.addCleanup(os.remove, file_item.storage.get_file_path())
+        
+        self.assertEqual(FileItem.objects.filter(item_type='directory').count(), 3)
+        self.assertEqual(file_item.parent.name, 'c')
+        self.assertEqual(file_item.parent.parent.name, 'b')
+        self.assertEqual(file_item.parent.parent.parent, FileItem.objects.get(name='a', item_type='directory'))
+    
+    def test_directory_created_concurrently_is_reused(self):
+        """Test a directory created by a parallel upload after the lookup is fetched, not duplicated"""
+        existing = FileItem.objects.create(name='a', item_type='directory', owner=self.user)
+        
+        directory = FileUploadView()._get_or_create_directory('a', None, self.user, 'private')
+        self.assertEqual(directory, existing)
+        self.assertEqual(FileItem.objects.filter(name='a', item_type='directory').count(), 1)
+
+
+class ScanDirectoryTestCase(APITestCase):
+    def setUp(self):
+        """Set up a small directory tree on disk"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.source = tempfile.TemporaryDirectory()
+        self.addCleanup(self.source.cleanup)
+        os.makedirs(os.path.join(self.source.name, 'docs', 'nested'))
+        for relative_path in ('top.txt', os.path.join('docs', 'a.txt'), os.path.join('docs', 'nested', 'b.txt')):
+            with open(os.path.join(self.source.name, relative_path), 'w') as f:
+                f.write(relative_path)
+        self.url = reverse('fileitem-scan-directory')
+    
+    def tearDown(self):
+        """Remove copies made in storage"""
+        for storage in FileStorage.objects.all():
+            if os.path.exists(storage.get_file_path()):
+                os.remove(storage.get_file_path())
+    
+    def test_scan_creates_tree_once(self):
+        """Test scanning imports the tree and a rescan adds nothing"""
+        response = self.client.post(self.url, {'path': self.source.name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(FileItem.objects.count(), 5)
+        
+        nested_file = FileItem.objects.get(name='b.txt')
+        self.assertEqual(nested_file.parent.name, 'nested')
+        self.assertEqual(nested_file.parent.parent.name, 'docs')
+        self.assertEqual(
+            nested_file.storage.checksum,
+            hashlib.sha256(os.path.join('docs', 'nested', 'b.txt').encode()).hexdigest()
+        )
+        
+        self.client.post(self.url, {'path': self.source.name})
+        self.assertEqual(FileItem.objects.count(), 5)
+    
+    def test_scan_only_loads_items_in_scanned_tree(self):
+        """Test existing items are looked up per scanned directory, not across the user's library"""
+        self.client.post(self.url, {'path': self.source.name})
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'path': self.source.name})
+        owner_lookups = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "filemanager_fileitem"."parent_id"') and '"owner_id" =' in query['sql']
+        ]
+        self.assertEqual(len(owner_lookups), 3)
+        self.assertTrue(all('"parent_id" IN' in sql or '"parent_id" IS NULL' in sql for sql in owner_lookups))
+    
+    def test_scan_skips_files_that_fail_to_copy(self):
+        """Test one unreadable file is skipped without aborting the rest of the import"""
+        from .utils import copy_and_hash
+        
+        def failing_copy(source_path, destination_path):
+            if source_path.endswith('a.txt'):
+                raise PermissionError(source_path)
+            return copy_and_hash(source_path, destination_path)
+        
+        with patch('filemanager.views.copy_and_hash', side_effect=failing_copy):
+            response = self.client.post(self.url, {'path': self.source.name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(FileItem.objects.filter(item_type='file').values_list('name', flat=True)), {'top.txt', 'b.txt'}
+        )
+    
+    def test_aborted_scan_removes_uncommitted_copies(self):
+        """Test copies whose records failed to insert are removed from storage"""
+        from django.conf import settings
+        from django.db import DatabaseError
+        
+        def stored_files():
+            return {os.path.join(root, name) for root, _, names in os.walk(settings.FILE_MANAGER_ROOT) for name in names}
+        
+        before = stored_files()
+        with patch.object(FileStorage.objects, 'bulk_create', side_effect=DatabaseError('insert failed')):
+            self.client.post(self.url, {'path': self.source.name})
+        self.assertFalse(FileItem.objects.filter(item_type='file').exists())
+        self.assertEqual(stored_files(), before)
+
+
+class FileOperationTestCase(APITestCase):
+    def setUp(self):
+        """Set up a user with a destination directory and two directories to operate on"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.destination = FileItem.objects.create(name='dest', item_type='directory', owner=self.user)
+        self.first = FileItem.objects.create(name='first', item_type='directory', owner=self.user)
+        self.second = FileItem.objects.create(name='second', item_type='directory', owner=self.user)
+        self.url = reverse('file-operations')
+    
+    def test_move_batch_reports_each_item(self):
+        """Test a batch move moves every item and reports missing ids"""
+        missing_id = uuid.uuid4()
+        response = self.client.post(self.url, {
+            'operation': 'move',
+            'file_ids': [str(self.first.id), str(missing_id), str(self.second.id)],
+            'destination_id': str(self.destination.id),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        results = response.data['results']
+        self.assertEqual([result['success'] for result in results], [True, False, True])
+        self.assertEqual(results[1]['error'], 'File not found')
+        self.assertEqual(
+            sorted(self.destination.children.values_list('name', flat=True)), ['first', 'second']
+        )
+    
+    def test_copy_batch_generates_unique_names(self):
+        """Test copies landing in the same directory get distinct names"""
+        response = self.client.post(self.url, {
+            'operation': 'copy',
+            'file_ids': [str(self.first.id), str(self.first.id)],
+            'destination_id': str(self.destination.id),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(self.destination.children.values_list('name', flat=True)), ['first', 'first (1)']
+        )
+    
+    def test_copy_keeps_sharing(self):
+        """Test copies keep the source item's shared users"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.first.visibility = 'user'
+        self.first.save()
+        self.first.shared_users.add(other)
+        
+        self.client.post(self.url, {
+            'operation': 'copy',
+            'file_ids': [str(self.first.id)],
+            'destination_id': str(self.destination.id),
+        }, format='json')
+        copy = self.destination.children.get(name='first')
+        self.assertEqual(list(copy.shared_users.all()), [other])
+    
+    def test_copy_file_into_directory(self):
+        """Test a copied file gets its own flat storage file with a valid checksum"""
+        upload = SimpleUploadedFile('notes.txt', b'hello world', content_type='text/plain')
+        source = FileItem.objects.get(id=self.client.post(
+            reverse('file-upload'), {'file': upload}, format='multipart'
+        ).data['id'])
+        self.addCleanup(os.remove, source.storage.get_file_path())
+        
+        response = self.client.post(self.url, {
+            'operation': 'copy',
+            'file_ids': [str(source.id)],
+            'destination_id': str(self.destination.id),
+        }, format='json')
+        self.assertTrue(response.data['results'][0]['success'])
+        
+        copy = self.destination.children.get(name='notes.txt')
+        self.addCleanup(os.remove, copy.storage.get_file_path())
+        self.assertNotEqual(copy.storage.file_path, source.storage.file_path)
+        self.assertEqual(copy.storage.file_path, os.path.basename(copy.storage.file_path))
+        self.assertEqual(copy.storage.checksum, source.storage.checksum)
+
+
+class DeletedFilesListTestCase(APITestCase):
+    def setUp(self):
+        """Set up a user with a few deleted items"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        for name in ('a', 'b', 'c'):
+            FileItem.objects.create(name=name, item_type='directory', owner=self.user).soft_delete(self.user)
+        self.url = reverse('deleted-files-list')
+    
+    def test_list_is_paginated_only_on_request(self):
+        """Test the full listing by default and a page when page_size is given"""
+        response = self.client.get(self.url)
+        self.assertEqual([item['name'] for item in response.data], ['a', 'b', 'c'])
+        
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([item['name'] for item in response.data['results']], ['a', 'b'])
+        self.assertEqual(response.data['pagination']['count'], 3)
+    
+    def test_list_excludes_other_users_files(self):
+        """Test the listing only includes the requesting user's deleted files"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        FileItem.objects.create(name='d', item_type='directory', owner=other).soft_delete(other)
+        
+        response = self.client.get(self.url)
+        self.assertEqual([item['name'] for item in response.data], ['a', 'b', 'c'])
+    
+    def test_superuser_restores_without_loading_permissions(self):
+        """Test a superuser restores another user's file without reading its sharing rows"""
+        admin = User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.force_authenticate(user=admin)
+        a = FileItem.objects.deleted_only().get(name='a')
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('deleted-files-restore'), {'file_ids': [str(a.id)]}, format='json')
+        self.assertTrue(response.data['results'][0]['success'])
+        self.assertFalse(any('fileaccesspermission' in query['sql'] for query in queries.captured_queries))
+    
+    def test_batch_size_is_bounded(self):
+        """Test oversized id lists are rejected before any lookup, while empty ones still succeed"""
+        url = reverse('deleted-files-restore')
+        response = self.client.post(url, {'file_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        
+        file_ids = [str(uuid.uuid4()) for _ in range(MAX_BATCH_FILE_IDS + 1)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'file_ids': file_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(queries.captured_queries), 0)
+    
+    def test_restore_and_hard_delete_batches(self):
+        """Test restore and hard delete report per-item results for a batch"""
+        a, b, c = FileItem.objects.deleted_only().order_by('name')
+        missing = uuid.uuid4()
+        
+        response = self.client.post(reverse('deleted-files-restore'), {'file_ids': [str(a.id), str(missing)]}, format='json')
+        self.assertEqual([result['success'] for result in response.data['results']], [True, False])
+        self.assertFalse(FileItem.objects.get(id=a.id).is_deleted)
+        
+        child = FileItem.objects.with_deleted().create(name='child', item_type='directory', owner=self.user, parent=b)
+        response = self.client.post(reverse('deleted-files-hard-delete'), {'file_ids': [str(b.id), str(c.id)]}, format='json')
+        self.assertTrue(all(result['success'] for result in response.data['results']))
+        self.assertFalse(FileItem.objects.with_deleted().filter(id__in=[b.id, c.id, child.id]).exists())
+    
+    def test_hard_delete_query_count_does_not_grow_with_subtree(self):
+        """Test cascading a subtree and its permissions is deleted in batches, not per row"""
+        def count_hard_delete_queries(name, size):
+            root = FileItem.objects.create(name=name, item_type='directory', owner=self.user)
+            for index in range(size):
+                child = FileItem.objects.create(name=f'child{index}', item_type='directory', owner=self.user, parent=root)
+                FileAccessPermission.objects.create(file=child, user=self.user, permission_type='read', granted_by=self.user)
+            root.soft_delete(self.user)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('deleted-files-hard-delete'), {'file_ids': [str(root.id)]}, format='json')
+            return len(queries.captured_queries)
+        
+        self.assertEqual(count_hard_delete_queries('small', 2), count_hard_delete_queries('large', 6))
+    
+    @patch('filemanager.views.HARD_DELETE_CHUNK_SIZE', 1)
+    def test_hard_delete_collects_storage_in_chunks(self):
+        """Test a subtree spanning several chunks has every storage row and file removed"""
+        b = FileItem.objects.deleted_only().get(name='b')
+        paths = []
+        for name in ('one.txt', 'two.txt'):
+            with tempfile.NamedTemporaryFile(delete=False) as handle:
+                handle.write(b'data')
+            self.addCleanup(lambda path=handle.name: os.path.exists(path) and os.remove(path))
+            paths.append(handle.name)
+            storage = FileStorage.objects.create(file_path=handle.name, file_size=4)
+            FileItem.objects.with_deleted().create(
+                name=name, item_type='file', owner=self.user, parent=b, storage=storage
+            )
+        
+        response = self.client.post(reverse('deleted-files-hard-delete'), {'file_ids': [str(b.id)]}, format='json')
+        self.assertTrue(response.data['results'][0]['success'])
+        self.assertFalse(FileStorage.objects.exists())
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+
+class FileAccessLogVisibilityTestCase(APITestCase):
+    def setUp(self):
+        """Set up logs on files owned by, administered by and hidden from the user"""
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        
+        own = FileItem.objects.create(name='own', item_type='directory', owner=self.user)
+        administered = FileItem.objects.create(name='administered', item_type='directory', owner=self.owner)
+        hidden = FileItem.objects.create(name='hidden', item_type='directory', owner=self.owner)
+        for permission_type in ('admin', 'read'):
+            FileAccessPermission.objects.create(
+                file=administered, user=self.user, permission_type=permission_type, granted_by=self.owner
+            )
+        for item in (own, administered, hidden):
+            FileAccessLog.objects.create(file=item, user=self.owner, action='download')
+    
+    def test_logs_limited_to_owned_and_administered_files(self):
+        """Test each visible log appears exactly once"""
+        response = self.client.get(reverse('fileaccesslog-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(str(log['file']) for log in response.data['results']), sorted(
+            str(item_id) for item_id in FileItem.objects.filter(
+                name__in=['own', 'administered']
+            ).values_list('id', flat=True)
+        ))
+    
+    def test_logs_paginate_by_cursor(self):
+        """Test following the next cursor walks every visible log once"""
+        response = self.client.get(reverse('fileaccesslog-list'), {'page_size': 1})
+        seen = [log['id'] for log in response.data['results']]
+        self.assertTrue(response.data['pagination']['has_next'])
+        
+        response = self.client.get(response.data['pagination']['next'])
+        seen += [log['id'] for log in response.data['results']]
+        self.assertFalse(response.data['pagination']['has_next'])
+        self.assertEqual(len(set(seen)), 2)
+    
+    def test_logs_filter_by_date_range(self):
+        """Test date and datetime bounds filter logs and malformed bounds are rejected"""
+        url = reverse('fileaccesslog-list')
+        response = self.client.get(url, {'start_date': '2000-01-01', 'action': 'download'})
+        self.assertEqual(len(response.data['results']), 2)
+        
+        response = self.client.get(url, {'end_date': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.data['results'], [])
+        
+        response = self.client.get(url, {'start_date': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FileAccessPermissionBulkCreateTestCase(APITestCase):
+    def setUp(self):
+        """Set up a file and two users to grant access to"""
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.first = User.objects.create_user(username='first', password='testpass123')
+        self.second = User.objects.create_user(username='second', password='testpass123')
+        self.client.force_authenticate(user=self.owner)
+        self.file = FileItem.objects.create(name='shared', item_type='directory', owner=self.owner)
+    
+    def test_list_payload_grants_and_logs_each_permission(self):
+        """Test a list of grants is saved together and logged after commit"""
+        payload = [
+            {'file': str(self.file.id), 'user': user.id, 'permission_type': 'read'}
+            for user in (self.first, self.second)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('fileaccesspermission-list'), payload, format='json')
+        flush_access_logs()
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(FileAccessPermission.objects.filter(file=self.file, granted_by=self.owner).count(), 2)
+        self.assertEqual(FileAccessLog.objects.filter(file=self.file, action='permission_granted').count(), 2)
+    
+    def test_list_query_count_is_constant(self):
+        """Test listing permissions doesn't query per row for the nested users"""
+        url = reverse('fileaccesspermission-list')
+        FileAccessPermission.objects.create(file=self.file, user=self.first, permission_type='read', granted_by=self.owner)
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(url)
+        
+        FileAccessPermission.objects.create(file=self.file, user=self.second, permission_type='read', granted_by=self.owner)
+        with CaptureQueriesContext(connection) as double:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(double.captured_queries), len(single.captured_queries))
+
+
+class FileListingQueryCountTestCase(APITestCase):
+    def setUp(self):
+        """Set up a user who shares directories with another user"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+    
+    def _create_directories(self, count):
+        for _ in range(count):
+            directory = FileItem.objects.create(
+                name=str(uuid.uuid4()), item_type='directory', owner=self.user, visibility='user'
+            )
+            directory.shared_users.add(self.other)
+            FileItem.objects.create(name='child', item_type='directory', owner=self.user, parent=directory)
+    
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('fileitem-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+    
+    def test_query_count_does_not_grow_with_items(self):
+        """Test serializing a listing issues the same queries for 2 or 6 items"""
+        self._create_directories(2)
+        self._count_list_queries()  # Warm the per-user group cache
+        small = self._count_list_queries()
+        self._create_directories(4)
+        self.assertEqual(self._count_list_queries(), small)
+    
+    def test_permissions_action_checks_prefetched_data(self):
+        """Test the permissions action answers every can_* check from one item load"""
+        directory = FileItem.objects.create(name='shared', item_type='directory', owner=self.other)
+        FileAccessPermission.objects.create(
+            file=directory, user=self.user, permission_type='write', granted_by=self.other
+        )
+        url = reverse('fileitem-permissions', kwargs={'pk': directory.pk})
+        self.client.get(url)  # Warm the per-user group cache
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['can_write'])
+        self.assertFalse(response.data['can_admin'])
+        # Only the prefetch reads permission rows
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "filemanager_fileaccesspermission"')
+        ]), 1)
+
+
+class RecursiveSharingTestCase(APITestCase):
+    def setUp(self):
+        """Set up a small tree and a user to share it with"""
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.target = User.objects.create_user(username='target', password='testpass123')
+        self.client.force_authenticate(user=self.owner)
+        self.root = FileItem.objects.create(name='root', item_type='directory', owner=self.owner)
+        self.child = FileItem.objects.create(name='child', item_type='directory', owner=self.owner, parent=self.root)
+        FileItem.objects.create(name='leaf', item_type='directory', owner=self.owner, parent=self.child)
+        self.payload = {
+            'share_type': 'user',
+            'target_id': str(self.target.uuid_map.uuid),
+            'permission_types': ['read', 'write'],
+        }
+    
+    def test_share_recursively_creates_and_reactivates(self):
+        """Test sharing grants every type on every item and reactivates revoked grants"""
+        url = reverse('fileitem-share-recursively', kwargs={'pk': self.root.pk})
+        response = self.client.post(url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['shared_items_count'], 6)
+        
+        FileAccessPermission.objects.filter(file=self.child).update(is_active=False)
+        response = self.client.post(url, self.payload, format='json')
+        self.assertEqual(response.data['shared_items_count'], 6)
+        self.assertEqual(FileAccessPermission.objects.filter(user=self.target, is_active=True).count(), 6)
+    
+    def test_share_recursively_grants_effective_permissions(self):
+        """Test recursively granted write access is honoured and reflected in visibility"""
+        url = reverse('fileitem-share-recursively', kwargs={'pk': self.root.pk})
+        self.client.post(url, self.payload, format='json')
+        
+        child = FileItem.objects.get(pk=self.child.pk)
+        self.assertTrue(child.can_write(self.target))
+        self.assertEqual(child.visibility, 'user')
+        self.assertEqual(
+            set(FileAccessPermission.objects.filter(file=child).values_list('permission_type', 'priority')),
+            {('read', 1), ('write', 2)}
+        )
+        
+        self.client.force_authenticate(user=self.target)
+        response = self.client.get(reverse('fileitem-list-children'), {'parent_id': str(self.root.pk)})
+        self.assertEqual([item['can_write'] for item in response.data['children']], [True])
+    
+    def test_share_recursively_rejects_unknown_permission_type(self):
+        """Test an unknown permission type is rejected before anything is written"""
+        url = reverse('fileitem-share-recursively', kwargs={'pk': self.root.pk})
+        response = self.client.post(url, dict(self.payload, permission_types=['read', 'own']), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(FileAccessPermission.objects.exists())
+    
+    def test_unshare_recursively_revokes_whole_tree(self):
+        """Test unsharing deactivates the target's permissions on every item"""
+        self.client.post(reverse('fileitem-share-recursively', kwargs={'pk': self.root.pk}), self.payload, format='json')
+        
+        url = reverse('fileitem-unshare-recursively', kwargs={'pk': self.root.pk})
+        response = self.client.post(url, dict(self.payload, permission_types=['write']), format='json')
+        self.assertEqual(response.data['revoked_permissions_count'], 3)
+        self.assertEqual(
+            set(FileAccessPermission.objects.filter(is_active=True).values_list('permission_type', flat=True)),
+            {'read'}
+        )
+    
+    def test_iter_descendants_yields_bounded_chunks(self):
+        """Test the tree walk yields every descendant in chunks of at most chunk_size"""
+        FileItem.objects.create(name='sibling', item_type='directory', owner=self.owner, parent=self.root)
+        chunks = list(FileItem.objects.iter_descendants([self.root.id], chunk_size=1))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1, 1])
+        self.assertEqual(
+            {item.name for chunk in chunks for item in chunk}, {'child', 'sibling', 'leaf'}
+        )
+    
+    @patch('filemanager.views.SHARE_CHUNK_SIZE', 1)
+    def test_share_and_unshare_recursively_in_chunks(self):
+        """Test a tree larger than one chunk is shared and unshared completely"""
+        response = self.client.post(
+            reverse('fileitem-share-recursively', kwargs={'pk': self.root.pk}), self.payload, format='json'
+        )
+        self.assertEqual(response.data['total_items'], 3)
+        self.assertEqual(response.data['shared_items_count'], 6)
+        
+        response = self.client.post(
+            reverse('fileitem-unshare-recursively', kwargs={'pk': self.root.pk}), self.payload, format='json'
+        )
+        self.assertEqual(response.data['total_items'], 3)
+        self.assertEqual(response.data['revoked_permissions_count'], 6)
+        self.assertFalse(FileAccessPermission.objects.filter(is_active=True).exists())
+    
+    def test_unshare_recursively_restores_private_visibility(self):
+        """Test revoking the last grants on an item makes it private again"""
+        self.client.post(reverse('fileitem-share-recursively', kwargs={'pk': self.root.pk}), self.payload, format='json')
+        self.assertEqual(FileItem.objects.get(pk=self.child.pk).visibility, 'user')
+        
+        self.client.post(reverse('fileitem-unshare-recursively', kwargs={'pk': self.root.pk}), self.payload, format='json')
+        self.assertEqual(set(FileItem.objects.values_list('visibility', flat=True)), {'private'})
+    
+    def test_unshare_recursively_without_permissions_skips_tree(self):
+        """Test unsharing from a target with nothing to revoke returns before walking the tree"""
+        url = reverse('fileitem-unshare-recursively', kwargs={'pk': self.root.pk})
+        self.client.post(url, self.payload, format='json')
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['revoked_permissions_count'], 0)
+        self.assertFalse(any('"parent_id" IN' in query['sql'] for query in queries.captured_queries))
+
+
+class UserSearchTestCase(APITestCase):
+    def setUp(self):
+        """Set up a few users to search for"""
+        self.user = User.objects.create_user(username='searcher', password='testpass123')
+        User.objects.create_user(username='alice', password='testpass123')
+        User.objects.create_user(username='alicia', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('user-search')
+    
+    def test_short_queries_return_nothing(self):
+        """Test queries shorter than two characters after stripping match no users"""
+        for query in ('', 'a', '  a  '):
+            response = self.client.get(self.url, {'q': query})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['results'], [])
+    
+    def test_query_is_stripped(self):
+        """Test surrounding whitespace doesn't prevent a match"""
+        response = self.client.get(self.url, {'q': ' alic '})
+        self.assertEqual(sorted(user['username'] for user in response.data['results']), ['alice', 'alicia'])
+    
+    def test_search_does_not_load_deferred_fields(self):
+        """Test rendering results doesn't fetch columns left out by only()"""
+        group = Group.objects.create(name='team')
+        User.objects.get(username='alice').groups.add(group)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'q': 'alic'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFalse(any('"password"' in query['sql'] for query in queries.captured_queries))
+
+
+class FileTagListCacheTestCase(APITestCase):
+    def setUp(self):
+        """Set up a user and a tag, starting from an empty cache"""
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        FileTag.objects.create(name='first')
+        self.url = reverse('filetag-list')
+    
+    def _tag_names(self):
+        return [tag['name'] for tag in self.client.get(self.url).data['results']]
+    
+    def test_list_is_cached_until_tags_change(self):
+        """Test repeated listings skip the database and tag writes refresh them"""
+        self.assertEqual(self._tag_names(), ['first'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._tag_names(), ['first'])
+        self.assertEqual(len(queries.captured_queries), 0)
+        
+        FileTag.objects.create(name='second')
+        self.assertEqual(sorted(self._tag_names()), ['first', 'second'])
+        
+        FileTag.objects.filter(name='first').get().delete()
+        self.assertEqual(self._tag_names(), ['second'])
+
+
+@patch('filemanager.utils._clone_file', return_value=False)
+class CopyFileFastTestCase(TestCase):
+    def setUp(self):
+        """Set up a source file and a destination path"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.source = os.path.join(self.directory.name, 'source.bin')
+        self.destination = os.path.join(self.directory.name, 'destination.bin')
+        self.content = os.urandom(64 * 1024)
+        with open(self.source, 'wb') as f:
+            f.write(self.content)
+    
+    def _copied_content(self):
+        with open(self.destination, 'rb') as f:
+            return f.read()
+    
+    def test_copy_file_range_returning_zero_falls_back(self, _clone_file):
+        """Test a copy_file_range that copies nothing doesn't leave an empty destination"""
+        with patch('filemanager.utils.os.copy_file_range', return_value=0, create=True):
+            copy_file_fast(self.source, self.destination)
+        self.assertEqual(self._copied_content(), self.content)
+    
+    def test_sendfile_returning_zero_falls_back(self, _clone_file):
+        """Test a sendfile that sends nothing doesn't count as a finished copy"""
+        with patch('filemanager.utils.os.copy_file_range', return_value=0, create=True), \
+                patch('filemanager.utils.os.sendfile', return_value=0):
+            copy_file_fast(self.source, self.destination)
+        self.assertEqual(self._copied_content(), self.content)
+    
+    def test_short_sendfile_is_completed_by_fallback(self, _clone_file):
+        """Test a sendfile that stops partway leaves the rest to the userspace copy"""
+        real_sendfile = os.sendfile
+        
+        def sendfile_first_block(out_fd, in_fd, offset, count):
+            return real_sendfile(out_fd, in_fd, offset, 4096) if offset == 0 else 0
+        
+        with patch('filemanager.utils.os.copy_file_range', return_value=0, create=True), \
+                patch('filemanager.utils.os.sendfile', side_effect=sendfile_first_block):
+            copy_file_fast(self.source, self.destination)
+        self.assertEqual(self._copied_content(), self.content)
+
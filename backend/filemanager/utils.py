@@ -1,10 +1,27 @@
+import errno
+import hashlib
 import os
+import shutil
 from pathlib import Path
 from django.conf import settings
 from django.core.exceptions import ValidationError
 import uuid
 import mimetypes
 
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# ioctl request number for a copy-on-write clone on Linux (Btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Errors meaning "this copy mechanism isn't supported here", so try the next one
+_COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EPERM,
+    getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP), errno.EOPNOTSUPP,
+}
+
 
 class FilePathManager:
     """Manages secure file paths within the FILE_MANAGER_ROOT directory with UUID-based naming"""
@@ -155,7 +172,7 @@ def determine_file_sharing(parent_directory, requested_visibility, requested_sha
         return requested_visibility, requested_shared_users, requested_shared_groups
     
     # Check if parent directory is shared
-    if parent_directory and parent_directory.owner != user:
+    if parent_directory and parent_directory.owner_id != user.id:
         # User is creating file in someone else's directory
         # Inherit the parent directory's sharing permissions
         parent_visibility = parent_directory.visibility
@@ -201,5 +218,109 @@ def determine_file_sharing(parent_directory, requested_visibility, requested_sha
     return 'private', [], []
 
 
+def copy_file_fast(source_path, destination_path):
+    """Copy a file using the cheapest mechanism the filesystem supports
+    
+    Tries a copy-on-write clone (FICLONE), then an in-kernel copy_file_range,
+    then sendfile, and finally a buffered userspace copy. File metadata is
+    copied afterwards, like shutil.copy2.
+    """
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        if not (_clone_file(source, destination)
+                or _copy_file_range(source, destination)
+                or _sendfile(source, destination)):
+            shutil.copyfileobj(source, destination, 1024 * 1024)
+    shutil.copystat(source_path, destination_path)
+    return destination_path
+
+
+def copy_and_hash(source_path, destination_path, buffer_size=1024 * 1024):
+    """Copy a file and return the SHA256 hex digest of its contents
+    
+    The data is hashed while it is copied, so the copy never has to be read
+    back. A copy-on-write clone is still preferred; the source is then read
+    once just for the hash. File metadata is copied afterwards, like
+    shutil.copy2.
+    """
+    sha256_hash = hashlib.sha256()
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        cloned = _clone_file(source, destination)
+        for chunk in iter(lambda: source.read(buffer_size), b''):
+            sha256_hash.update(chunk)
+            if not cloned:
+                destination.write(chunk)
+    shutil.copystat(source_path, destination_path)
+    return sha256_hash.hexdigest()
+
+
+def _clone_file(source, destination):
+    """Reflink source into destination; returns False if unsupported"""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        return True
+    except OSError as e:
+        if e.errno in _COPY_FALLBACK_ERRNOS or e.errno == errno.ENOTTY:
+            return False
+        raise
+
+
+def _copy_file_range(source, destination):
+    """Copy with os.copy_file_range; returns False unless the whole file was copied
+    
+    Some filesystems report 0 bytes copied instead of failing. The copy then
+    stops where it got to, with both file offsets advanced past the copied
+    data, so the caller's fallback carries on from there.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    
+    offset = 0
+    remaining = os.fstat(source.fileno()).st_size
+    while remaining > 0:
+        try:
+            copied = os.copy_file_range(source.fileno(), destination.fileno(), remaining)
+        except OSError as e:
+            if offset == 0 and e.errno in _COPY_FALLBACK_ERRNOS:
+                return False
+            raise
+        if copied == 0:
+            source.seek(offset)
+            destination.seek(offset)
+            return False
+        offset += copied
+        remaining -= copied
+    return True
+
+
+def _sendfile(source, destination):
+    """Copy with os.sendfile; returns False unless the whole file was copied
+    
+    sendfile reads at an explicit offset and leaves the source position
+    alone, so on a short copy the source is moved past the data already
+    sent before the caller's fallback carries on.
+    """
+    if not hasattr(os, 'sendfile'):
+        return False
+    
+    offset = 0
+    remaining = os.fstat(source.fileno()).st_size
+    while remaining > 0:
+        try:
+            sent = os.sendfile(destination.fileno(), source.fileno(), offset, remaining)
+        except OSError as e:
+            if offset == 0 and (e.errno in _COPY_FALLBACK_ERRNOS or e.errno == errno.ENOTSOCK):
+                return False
+            raise
+        if sent == 0:
+            source.seek(offset)
+            destination.seek(offset)
+            return False
+        offset += sent
+        remaining -= sent
+    return True
+
+
 # Global instance
 file_path_manager = FilePathManager()
@@ -3,23 +3,31 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
+from rest_framework.fields import DateTimeField
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from django.db.models import Q, Exists, OuterRef, Prefetch, prefetch_related_objects
 from django.core.exceptions import ValidationError
-from django.http import Http404
-from django.db import IntegrityError, transaction
-from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, connection, transaction
+from django.core.cache import cache
+from django.conf import settings
+from django.utils import timezone
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 
 from django.contrib.auth.models import Group, User
+import hashlib
+import logging
 import os
-import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 
 from .models import (
     FileItem, FileTag, FileTagRelation, FileAccessLog, 
     FileAccessPermission, FilePermissionRequest, FileStorage, FileThumbnail,
-    UserUUIDMap, GroupUUIDMap
+    UserUUIDMap, GroupUUIDMap, get_user_group_ids, get_children_version, get_tag_list_version,
+    bump_tag_list_version
 )
-from .utils import FilePathManager
 from .serializers import (
     FileItemSerializer, FileItemCreateSerializer, FileItemUpdateSerializer,
     FileTagSerializer, FileTagRelationSerializer, FileAccessLogSerializer,
@@ -32,9 +40,55 @@ from .serializers import (
     FileContentUpdateSerializer
 )
 from .pagination import (
-    FileItemPagination, FileAccessLogPagination, FileTagPagination
+    FileItemPagination, FileAccessLogPagination, FileTagPagination, DeletedFilesPagination
 )
-from .utils import file_path_manager, determine_file_sharing
+from .utils import FilePathManager, file_path_manager, determine_file_sharing, copy_file_fast, copy_and_hash
+from .access_log import enqueue_access_log, get_client_ip
+
+logger = logging.getLogger(__name__)
+
+
+# Cached directory listings are versioned by the parent's get_children_version().
+# The timeout bounds how long a listing can miss a change made outside the ORM
+# hooks that bump it (e.g. raw SQL), and how long unused entries are kept around.
+CHILDREN_CACHE_TIMEOUT = 300
+
+# Tag listings are shared by all users; writes bump their version, the timeout is a backstop
+TAG_LIST_CACHE_TIMEOUT = 60
+
+# Upper bound on the number of results a single search request may return
+SEARCH_MAX_LIMIT = 1000
+
+# Shortest query the user and group search views match; shorter ones match almost everything
+SEARCH_MIN_QUERY_LENGTH = 2
+
+# Thread pool size and insert batch size for directory scans. The workers mostly
+# wait on disk I/O with the GIL released, so use several per CPU.
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+SCAN_BATCH_SIZE = 500
+
+# Buffer size used when copying uploaded data into storage
+UPLOAD_COPY_BUFFER_SIZE = 1024 * 1024
+
+# Items handled per round of permission reads and writes in recursive sharing
+SHARE_CHUNK_SIZE = 1000
+
+# Ids per IN lookup when collecting and deleting the storage of a hard-deleted subtree
+HARD_DELETE_CHUNK_SIZE = 1000
+
+# Background workers for thumbnail generation, shared by all requests in the process
+THUMBNAIL_WORKERS = 2
+_thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+
+
+def _remove_file(path):
+    """Remove a stored file, logging rather than raising when that fails"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning('Failed to remove %s', path, exc_info=True)
 
 
 def resolve_user_identifier(value):
@@ -55,6 +109,39 @@ def resolve_group_identifier(value):
         return group_map.group_id
 
 
+def administered_file_q(user):
+    """Match rows whose ``file`` the user owns or holds an admin permission on.
+
+    The admin permission is tested with an EXISTS subquery, so rows are never
+    duplicated by the join and no ``.distinct()`` is needed.
+    """
+    admin_permission = FileAccessPermission.objects.filter(
+        file=OuterRef('file'), user=user, permission_type='admin'
+    )
+    return (
+        Q(file__owner=user) |  # Own files
+        Exists(admin_permission)  # Admin access
+    )
+
+
+def add_initial_sharing(file_item, user_ids=(), group_ids=()):
+    """Share a newly created item with the given users and groups.
+
+    A new item has no M2M rows yet, so the through tables are inserted directly
+    instead of going through ``.set()``, which reads and diffs them first.
+    """
+    SharedUser = FileItem.shared_users.through
+    SharedGroup = FileItem.shared_groups.through
+    SharedUser.objects.bulk_create([
+        SharedUser(fileitem_id=file_item.id, user_id=user_id) for user_id in set(user_ids)
+    ], ignore_conflicts=True)
+    SharedGroup.objects.bulk_create([
+        SharedGroup(fileitem_id=file_item.id, group_id=group_id) for group_id in set(group_ids)
+    ], ignore_conflicts=True)
+    # bulk_create skips m2m_changed, so invalidate the cached listing explicitly
+    FileItem.objects.mark_children_changed([file_item.parent_id])
+
+
 class FileItemViewSet(viewsets.ModelViewSet):
     """ViewSet for managing file system items"""
     queryset = FileItem.objects.all()
@@ -70,20 +157,36 @@ class FileItemViewSet(viewsets.ModelViewSet):
             return []
         return super().get_permissions()
     
+    def initial(self, request, *args, **kwargs):
+        # Drop any object resolved by a previous dispatch of this view instance
+        self._cached_object = None
+        super().initial(request, *args, **kwargs)
+    
     def get_object(self):
         """
         Override get_object for stream action to bypass permission filtering
+        
+        The resolved object is memoized per request so repeated calls don't re-run
+        the permission-filtered queryset.
         """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup_value = self.kwargs[lookup_url_kwarg]
+        cached = getattr(self, '_cached_object', None)
+        if cached is not None and cached[0] == lookup_value:
+            return cached[1]
+        
         if self.action == 'stream' or self.action == 'download_with_token':
             # For streaming, get the object directly without permission filtering
             # Authentication will be handled in the stream method
-            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
-            lookup_value = self.kwargs[lookup_url_kwarg]
             try:
-                return FileItem.objects.get(**{self.lookup_field: lookup_value})
+                obj = FileItem.objects.get(**{self.lookup_field: lookup_value})
             except (FileItem.DoesNotExist, ValidationError):
                 raise Http404
-        return super().get_object()
+        else:
+            obj = super().get_object()
+        
+        self._cached_object = (lookup_value, obj)
+        return obj
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -93,7 +196,7 @@ class FileItemViewSet(viewsets.ModelViewSet):
         return FileItemSerializer
     
     def get_queryset(self):
-        queryset = FileItem.objects.all()
+        queryset = FileItem.objects.with_related()
         user = self.request.user
         
         # Ensure user is authenticated (this should be handled by permission_classes, but double-check)
@@ -101,17 +204,8 @@ class FileItemViewSet(viewsets.ModelViewSet):
             return FileItem.objects.none()
         
         # Filter based on user permissions
-        if not user.is_superuser:
-            # User can see: their own files, public files, files shared with them, and files shared with their groups
-            user_groups = user.groups.all()
-            queryset = queryset.filter(
-                Q(owner=user) |  # Own files
-                Q(visibility='public') |  # Public files
-                Q(visibility='user', shared_users=user) |  # User shared files
-                Q(visibility='group', shared_groups__in=user_groups) |  # Group shared files
-                Q(access_permissions__user=user, access_permissions__is_active=True) |  # Explicit user permissions
-                Q(access_permissions__group__in=user_groups, access_permissions__is_active=True)  # Explicit group permissions
-            ).distinct()
+        # User can see: their own files, public files, files shared with them, and files shared with their groups
+        queryset = queryset.visible_to(user)
         
         # Filter by item type
         item_type = self.request.query_params.get('type', None)
@@ -145,7 +239,7 @@ class FileItemViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         # Check if user can write to this file
-        instance = self.get_object()
+        instance = serializer.instance
         if not instance.can_write(self.request.user):
             raise PermissionError("You don't have permission to modify this file")
         serializer.save()
@@ -170,46 +264,46 @@ class FileItemViewSet(viewsets.ModelViewSet):
         if not file_item.storage:
             return Response({'error': 'File storage not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        file_path = file_item.storage.get_file_path()
-        if not os.path.exists(file_path):
+        # Open straight away instead of stat-ing first; a missing file raises here
+        try:
+            file_handle = open(file_item.storage.get_file_path(), 'rb')
+        except FileNotFoundError:
             return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
+        except OSError as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Log the download
-        FileAccessLog.objects.create(
+        enqueue_access_log(
             file=file_item,
             user=request.user if request.user.is_authenticated else None,
             action='download',
-            ip_address=self.get_client_ip(request),
+            ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
+        # Check if file should be displayed inline (browser preview) or downloaded
+        mime_type = file_item.storage.mime_type or 'application/octet-stream'
+        browser_supported_types = [
+            'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp', 'image/svg+xml', 'image/bmp',
+            'application/pdf', 'text/plain', 'text/html', 'text/css', 'text/javascript', 'application/json',
+            'text/xml', 'application/xml', 'text/csv',
+            'audio/mpeg', 'audio/wav', 'audio/ogg', 'video/mp4', 'video/webm', 'video/ogg'
+        ]
+        
+        # Check if user wants to force download (via query parameter)
+        force_download = request.GET.get('download', '').lower() == 'true'
+        
         try:
-            response = FileResponse(open(file_path, 'rb'))
-            
-            # Set appropriate content type
-            mime_type = file_item.storage.mime_type or 'application/octet-stream'
-            response['Content-Type'] = mime_type
-            
-            # Check if file should be displayed inline (browser preview) or downloaded
-            browser_supported_types = [
-                'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp', 'image/svg+xml', 'image/bmp',
-                'application/pdf', 'text/plain', 'text/html', 'text/css', 'text/javascript', 'application/json',
-                'text/xml', 'application/xml', 'text/csv',
-                'audio/mpeg', 'audio/wav', 'audio/ogg', 'video/mp4', 'video/webm', 'video/ogg'
-            ]
-            
-            # Check if user wants to force download (via query parameter)
-            force_download = request.GET.get('download', '').lower() == 'true'
-            
-            if mime_type in browser_supported_types and not force_download:
-                # Display in browser
-                response['Content-Disposition'] = f'inline; filename="{file_item.name}"'
-            else:
-                # Force download
-                response['Content-Disposition'] = f'attachment; filename="{file_item.name}"'
-            
-            return response
+            # FileResponse builds Content-Disposition/Content-Length itself and hands the
+            # open file to wsgi.file_wrapper, so servers can send it with sendfile()
+            return FileResponse(
+                file_handle,
+                as_attachment=force_download or mime_type not in browser_supported_types,
+                filename=file_item.name,
+                content_type=mime_type
+            )
         except Exception as e:
+            file_handle.close()
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=True, methods=['get'])
@@ -251,9 +345,6 @@ class FileItemViewSet(viewsets.ModelViewSet):
         if token:
             # Authenticate using JWT token from query parameter
             try:
-                from rest_framework_simplejwt.tokens import AccessToken
-                from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-                
                 # Validate and decode the JWT token
                 access_token = AccessToken(token)
                 user_id = access_token['user_id']
@@ -274,11 +365,11 @@ class FileItemViewSet(viewsets.ModelViewSet):
             return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Log the stream access
-        FileAccessLog.objects.create(
+        enqueue_access_log(
             file=file_item,
             user=user if user.is_authenticated else None,
             action='stream',
-            ip_address=self.get_client_ip(request),
+            ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
@@ -392,8 +483,6 @@ class FileItemViewSet(viewsets.ModelViewSet):
         
         # Authenticate using JWT token from query parameter
         try:
-            from rest_framework_simplejwt.tokens import AccessToken
-            from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
             
             # Validate and decode the JWT token
             access_token = AccessToken(token)
@@ -413,11 +502,11 @@ class FileItemViewSet(viewsets.ModelViewSet):
             return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Log the download
-        FileAccessLog.objects.create(
+        enqueue_access_log(
             file=file_item,
             user=user,
             action='download',
-            ip_address=self.get_client_ip(request),
+            ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
@@ -462,11 +551,11 @@ class FileItemViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
         # Log the preview
-        FileAccessLog.objects.create(
+        enqueue_access_log(
             file=file_item,
             user=request.user if request.user.is_authenticated else None,
             action='view',
-            ip_address=self.get_client_ip(request),
+            ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
@@ -497,11 +586,11 @@ class FileItemViewSet(viewsets.ModelViewSet):
             elif 'shared_groups' in serializer.validated_data:
                 action_type = 'group_shared' if file_item.visibility == 'group' else 'visibility_change'
             
-            FileAccessLog.objects.create(
+            enqueue_access_log(
                 file=file_item,
                 user=request.user,
                 action=action_type,
-                ip_address=self.get_client_ip(request),
+                ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')
             )
             
@@ -511,6 +600,8 @@ class FileItemViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def permissions(self, request, pk=None):
         """Get file permissions for current user"""
+        # get_queryset prefetches access_permissions, shared_users and shared_groups,
+        # so the checks below run in Python without further queries
         file_item = self.get_object()
         
         if not file_item.can_access(request.user, 'read'):
@@ -522,16 +613,17 @@ class FileItemViewSet(viewsets.ModelViewSet):
         # Get specific permissions if user has admin access
         specific_permissions = []
         if file_item.can_admin(request.user):
-            specific_permissions = FileAccessPermission.objects.filter(
-                file=file_item,
-                is_active=True
-            ).select_related('user', 'group', 'granted_by')
+            # Reuse the permissions prefetched by get_queryset instead of querying again
+            specific_permissions = [
+                permission for permission in file_item.access_permissions.all() if permission.is_active
+            ]
+            prefetch_related_objects(specific_permissions, 'granted_by')
             specific_permissions = FileAccessPermissionSerializer(specific_permissions, many=True).data
         
         return Response({
             'effective_permissions': list(effective_permissions),
             'specific_permissions': specific_permissions,
-            'can_read': file_item.can_access(request.user, 'read'),
+            'can_read': True,  # Checked above
             'can_write': file_item.can_write(request.user),
             'can_delete': file_item.can_delete(request.user),
             'can_share': file_item.can_share(request.user),
@@ -594,34 +686,26 @@ class FileItemViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        if not user.is_superuser:
-            user_groups = user.groups.all()
-            queryset = queryset.filter(
-                Q(owner=user) |  # Own files
-                Q(visibility='public') |  # Public files
-                Q(visibility='user', shared_users=user) |  # User shared files
-                Q(visibility='group', shared_groups__in=user_groups) |  # Group shared files
-                Q(access_permissions__user=user, access_permissions__is_active=True) |  # Explicit user permissions
-                Q(access_permissions__group__in=user_groups, access_permissions__is_active=True)  # Explicit group permissions
-            ).distinct()
+        queryset = queryset.visible_to(user)
         
         # Apply additional filters
         item_type = request.query_params.get('type', None)
         if item_type:
             queryset = queryset.filter(item_type=item_type)
         
-        # Limit results
-        limit = int(request.query_params.get('limit', 100))
-        queryset = queryset[:limit]
+        # Limit results (capped so a single request can't pull the whole table)
+        limit = min(int(request.query_params.get('limit', 100)), SEARCH_MAX_LIMIT)
+        queryset = queryset.with_related()[:limit]
         
         search_time = time.time() - start_time
         
         serializer = FileItemSerializer(queryset, many=True, context={'request': request})
+        results = serializer.data
         
         response_data = {
             'query': query,
-            'results': serializer.data,
-            'total_count': queryset.count(),
+            'results': results,
+            'total_count': len(results),
             'search_time': search_time
         }
         
@@ -637,19 +721,7 @@ class FileItemViewSet(viewsets.ModelViewSet):
     
     def _get_descendant_ids(self, directory):
         """Get all descendant node IDs under a directory recursively"""
-        descendant_ids = []
-        
-        def _traverse(current_dir):
-            # Get direct children
-            children = FileItem.objects.filter(parent=current_dir, is_deleted=False)
-            for child in children:
-                descendant_ids.append(child.id)
-                # If it's a directory, traverse its children too
-                if child.item_type == 'directory':
-                    _traverse(child)
-        
-        _traverse(directory)
-        return descendant_ids
+        return [item.id for item in FileItem.objects.tree_fields().descendants([directory.id])]
 
     
     @action(detail=False, methods=['post'])
@@ -687,21 +759,19 @@ class FileItemViewSet(viewsets.ModelViewSet):
             # Get parent directory if specified
             parent_directory = None
             if parent_id:
-                try:
-                    parent_directory = FileItem.objects.get(id=parent_id, item_type='directory')
-                    # Check if user can write to parent directory
-                    if not parent_directory.can_write(request.user):
-                        return Response({'error': 'Access denied to parent directory'}, status=status.HTTP_403_FORBIDDEN)
-                except FileItem.DoesNotExist:
+                parent_directory = FileItem.objects.filter(id=parent_id, item_type='directory').prefetch_related(
+                    'access_permissions', 'shared_users', 'shared_groups'
+                ).first()
+                if parent_directory is None:
                     return Response({'error': 'Parent directory not found'}, status=status.HTTP_404_NOT_FOUND)
+                
+                # Check if user can write to parent directory
+                if not parent_directory.can_write(request.user):
+                    return Response({'error': 'Access denied to parent directory'}, status=status.HTTP_403_FORBIDDEN)
             
-            # Check if directory already exists in database
-            if parent_directory:
-                if FileItem.objects.filter(parent=parent_directory, name=name, item_type='directory').exists():
-                    return Response({'error': 'Directory already exists'}, status=status.HTTP_409_CONFLICT)
-            else:
-                if FileItem.objects.filter(parent__isnull=True, name=name, item_type='directory').exists():
-                    return Response({'error': 'Directory already exists'}, status=status.HTTP_409_CONFLICT)
+            # Check if directory already exists in database (parent=None matches root items)
+            if FileItem.objects.filter(parent=parent_directory, name=name, item_type='directory').exists():
+                return Response({'error': 'Directory already exists'}, status=status.HTTP_409_CONFLICT)
             
             # Determine directory visibility and sharing based on parent directory
             dir_visibility, dir_shared_users, dir_shared_groups = determine_file_sharing(
@@ -717,22 +787,18 @@ class FileItemViewSet(viewsets.ModelViewSet):
                 visibility=dir_visibility
             )
             
-            # Add shared users if visibility is 'user'
+            # Add shared users if visibility is 'user', shared groups if it is 'group'
             if dir_visibility == 'user' and dir_shared_users:
-                users = User.objects.filter(id__in=dir_shared_users)
-                directory_item.shared_users.set(users)
-            
-            # Add shared groups if visibility is 'group'
-            if dir_visibility == 'group' and dir_shared_groups:
-                groups = Group.objects.filter(id__in=dir_shared_groups)
-                directory_item.shared_groups.set(groups)
+                add_initial_sharing(directory_item, user_ids=dir_shared_users)
+            elif dir_visibility == 'group' and dir_shared_groups:
+                add_initial_sharing(directory_item, group_ids=dir_shared_groups)
             
             # Log the directory creation
-            FileAccessLog.objects.create(
+            enqueue_access_log(
                 file=directory_item,
                 user=request.user,
                 action='create',
-                ip_address=self.get_client_ip(request),
+                ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')
             )
             
@@ -759,30 +825,24 @@ class FileItemViewSet(viewsets.ModelViewSet):
         if not file_item.can_access(request.user, 'read'):
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Get direct children (not recursive)
-        children = FileItem.objects.filter(
-            parent=file_item,
-            is_active=True
-        ).order_by('item_type', 'name')  # Directories first, then files, alphabetically
-        
         # Apply permission filtering for children
         user = request.user
         if not user.is_authenticated:
             return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        if not user.is_superuser:
-            user_groups = user.groups.all()
-            children = children.filter(
-                Q(owner=user) |  # Own files
-                Q(visibility='public') |  # Public files
-                Q(visibility='user', shared_users=user) |  # User shared files
-                Q(visibility='group', shared_groups__in=user_groups) |  # Group shared files
-                Q(access_permissions__user=user, access_permissions__is_active=True) |  # Explicit user permissions
-                Q(access_permissions__group__in=user_groups, access_permissions__is_active=True)  # Explicit group permissions
-            ).distinct()
-        
-        # Serialize children with full context
-        serializer = FileItemSerializer(children, many=True, context={'request': request})
+        cache_key = self._children_cache_key(request, file_item, user)
+        children_data = cache.get(cache_key)
+        if children_data is None:
+            # Get direct children (not recursive)
+            children = FileItem.objects.filter(
+                parent=file_item
+            ).order_by('item_type', 'name')  # Directories first, then files, alphabetically
+            
+            children = children.visible_to(user).with_related()
+            
+            # Serialize children with full context
+            children_data = FileItemSerializer(children, many=True, context={'request': request}).data
+            cache.set(cache_key, children_data, CHILDREN_CACHE_TIMEOUT)
         
         return Response({
             'parent': {
@@ -790,9 +850,26 @@ class FileItemViewSet(viewsets.ModelViewSet):
                 'name': file_item.name,
                 'item_type': file_item.item_type
             },
-            'children': serializer.data,
-            'total_count': len(serializer.data)
+            'children': children_data,
+            'total_count': len(children_data)
         })
+    
+    def _children_cache_key(self, request, parent, user):
+        """Build the cache key for a directory listing
+        
+        Serialized items carry per-user fields (can_write, parents, ...), so the
+        key is scoped to the user and their groups, and absolute download and
+        thumbnail URLs, so it is scoped to the scheme and host as well. It also
+        embeds the parent's children version, which any child change replaces.
+        """
+        if user.is_superuser:
+            groups_key = 'su'
+        else:
+            groups_key = ','.join(str(group_id) for group_id in sorted(get_user_group_ids(user)))
+        return (
+            f"children:{parent.id}:{user.id}:{groups_key}:{get_children_version(parent.id)}:"
+            f"{request.build_absolute_uri('/')}"
+        )
 
     def _get_orphaned_shared_items(self, user):
         """Get items that user has access to but whose parents they don't have access to
@@ -803,28 +880,13 @@ class FileItemViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return FileItem.objects.none()
         
-        user_groups = user.groups.all()
-        
-        # Get all items the user has access to
-        accessible_items = FileItem.objects.filter(
-            Q(owner=user) |  # Own files
-            Q(visibility='public') |  # Public files
-            Q(visibility='user', shared_users=user) |  # User shared files
-            Q(visibility='group', shared_groups__in=user_groups) |  # Group shared files
-            Q(access_permissions__user=user, access_permissions__is_active=True) |  # Explicit user permissions
-            Q(access_permissions__group__in=user_groups, access_permissions__is_active=True)  # Explicit group permissions
-        ).distinct()
-        
-        # Filter out items that are already at root level
-        non_root_items = accessible_items.filter(parent__isnull=False)
-        
-        # Find items whose parents the user cannot access
-        orphaned_items = []
-        for item in non_root_items:
-            if item.parent and not item.parent.can_access(user, 'read'):
-                orphaned_items.append(item)
+        # Parents the user can see, evaluated by the database as a subquery
+        visible_parents = FileItem.objects.with_deleted().visible_to(user).values('pk')
         
-        return FileItem.objects.filter(id__in=[item.id for item in orphaned_items])
+        # Accessible non-root items whose parent the user cannot see
+        return FileItem.objects.visible_to(user).filter(
+            parent__isnull=False
+        ).exclude(parent__in=visible_parents)
 
     @action(detail=False, methods=['get'])
     def list_children(self, request):
@@ -832,28 +894,28 @@ class FileItemViewSet(viewsets.ModelViewSet):
         parent_id = request.query_params.get('parent_id', None)
         
         if parent_id:
-            # Get children of specific parent
-            try:
-                parent_item = FileItem.objects.get(id=parent_id)
-                
-                # Check if it's a directory
-                if parent_item.item_type != 'directory':
-                    return Response({'error': 'Parent item is not a directory'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Check if user can access this directory
-                if not parent_item.can_access(request.user, 'read'):
-                    return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
-                
-                # Get direct children (not recursive)
-                children = FileItem.objects.filter(
-                    parent=parent_item
-                )  # Will be ordered later
-                
-                # Use full serializer for parent to include parents field
-                parent_serializer = FileItemSerializer(parent_item, context={'request': request})
-                parent_info = parent_serializer.data
-            except FileItem.DoesNotExist:
+            # Get children of specific parent. with_related() loads the permission rows the
+            # access check needs together with everything the parent serializer reads.
+            parent_item = FileItem.objects.with_related().filter(id=parent_id).first()
+            if parent_item is None:
                 return Response({'error': 'Parent directory not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            # Check if it's a directory
+            if parent_item.item_type != 'directory':
+                return Response({'error': 'Parent item is not a directory'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Check if user can access this directory
+            if not parent_item.can_access(request.user, 'read'):
+                return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+            
+            # Get direct children (not recursive)
+            children = FileItem.objects.filter(
+                parent=parent_item
+            )  # Will be ordered later
+            
+            # Use full serializer for parent to include parents field
+            parent_serializer = FileItemSerializer(parent_item, context={'request': request})
+            parent_info = parent_serializer.data
         else:
             # List top-level files (no parent)
             children = FileItem.objects.filter(
@@ -867,16 +929,7 @@ class FileItemViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        if not user.is_superuser:
-            user_groups = user.groups.all()
-            children = children.filter(
-                Q(owner=user) |  # Own files
-                Q(visibility='public') |  # Public files
-                Q(visibility='user', shared_users=user) |  # User shared files
-                Q(visibility='group', shared_groups__in=user_groups) |  # Group shared files
-                Q(access_permissions__user=user, access_permissions__is_active=True) |  # Explicit user permissions
-                Q(access_permissions__group__in=user_groups, access_permissions__is_active=True)  # Explicit group permissions
-            ).distinct()
+        children = children.visible_to(user)
         
         # If listing root directory, also include orphaned shared items
         if parent_id is None:
@@ -884,20 +937,27 @@ class FileItemViewSet(viewsets.ModelViewSet):
             # Get IDs from both querysets and combine them
             children_ids = list(children.values_list('id', flat=True))
             orphaned_ids = list(orphaned_items.values_list('id', flat=True))
+            orphaned_count = len(orphaned_ids)
             all_ids = children_ids + orphaned_ids
             
             # Get all items with the combined IDs and order them
-            all_items = FileItem.objects.filter(id__in=all_ids).order_by('item_type', 'name')
+            all_items = FileItem.objects.filter(id__in=all_ids).with_related().order_by('item_type', 'name')
+            
+            # Serialize children with full context
+            children_data = FileItemSerializer(all_items, many=True, context={'request': request}).data
         else:
-            # For specific parent directories, just apply ordering
-            all_items = children.order_by('item_type', 'name')
-        
-        # Serialize children with full context
-        serializer = FileItemSerializer(all_items, many=True, context={'request': request})
+            # Listings of a specific directory are cached until one of its children changes
+            cache_key = self._children_cache_key(request, parent_item, user)
+            children_data = cache.get(cache_key)
+            if children_data is None:
+                # For specific parent directories, just apply ordering
+                all_items = children.with_related().order_by('item_type', 'name')
+                children_data = FileItemSerializer(all_items, many=True, context={'request': request}).data
+                cache.set(cache_key, children_data, CHILDREN_CACHE_TIMEOUT)
         
         response_data = {
-            'children': serializer.data,
-            'total_count': len(serializer.data)
+            'children': children_data,
+            'total_count': len(children_data)
         }
         
         if parent_info:
@@ -905,9 +965,8 @@ class FileItemViewSet(viewsets.ModelViewSet):
         else:
             response_data['parent'] = None
             response_data['message'] = 'Listing top-level files and directories'
-            # Add info about orphaned items if any
+            # Add info about orphaned items if any (counted when building the listing)
             if parent_id is None:
-                orphaned_count = len(self._get_orphaned_shared_items(user))
                 if orphaned_count > 0:
                     response_data['orphaned_shared_count'] = orphaned_count
                     response_data['message'] += f' (including {orphaned_count} shared items from inaccessible parent directories)'
@@ -916,121 +975,185 @@ class FileItemViewSet(viewsets.ModelViewSet):
 
     
     def _scan_directory_recursive(self, directory_path, user):
-        """Recursively scan directory and add items to database"""
+        """Recursively scan directory and add items to database
+        
+        The tree is walked a level at a time. The existing children of each
+        level's directories are loaded with a few ``parent_id IN`` queries, so
+        the cost follows the scanned tree rather than the user's whole library.
+        Directories are created level by level so children can reference them.
+        Files are copied and checksummed on a thread pool, then inserted in
+        batches from this thread.
+        """
         scanned_count = 0
         
         try:
-            # Get the relative path from the scan root
-            scan_root = directory_path
-            for root, dirs, files in os.walk(directory_path):
-                # Calculate relative path from scan root
-                rel_path = os.path.relpath(root, scan_root) if root != scan_root else ""
-                
-                # Add directories
-                for dir_name in dirs:
-                    # Check if directory already exists by name and parent
-                    parent_dir = None
-                    if rel_path:
-                        # Find parent directory in database
-                        parent_parts = rel_path.split(os.sep)
-                        current_parent = None
-                        for part in parent_parts:
-                            if current_parent:
-                                current_parent = FileItem.objects.filter(
-                                    parent=current_parent, 
-                                    name=part, 
-                                    item_type='directory'
-                                ).first()
-                            else:
-                                current_parent = FileItem.objects.filter(
-                                    parent__isnull=True, 
-                                    name=part, 
-                                    item_type='directory'
-                                ).first()
-                        parent_dir = current_parent
-                    
-                    if not FileItem.objects.filter(parent=parent_dir, name=dir_name, item_type='directory').exists():
-                        FileItem.objects.create(
-                            name=dir_name,
-                            item_type='directory',
-                            parent=parent_dir,
-                            owner=user
-                        )
-                        scanned_count += 1
+            # Directories of the current level: (path relative to the scan root, id, existed before)
+            level = [('', None, True)]
+            pending_files = []
+            
+            while level:
+                existing = self._existing_scan_children(
+                    [parent_id for _, parent_id, existed in level if existed], user
+                )
+                next_level = []
+                new_directories = []
                 
-                # Add files
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    
-                    # Find parent directory
-                    parent_dir = None
-                    if rel_path:
-                        parent_parts = rel_path.split(os.sep)
-                        current_parent = None
-                        for part in parent_parts:
-                            if current_parent:
-                                current_parent = FileItem.objects.filter(
-                                    parent=current_parent, 
-                                    name=part, 
-                                    item_type='directory'
-                                ).first()
-                            else:
-                                current_parent = FileItem.objects.filter(
-                                    parent__isnull=True, 
-                                    name=part, 
-                                    item_type='directory'
-                                ).first()
-                        parent_dir = current_parent
+                for rel_path, parent_id, _ in level:
+                    root = os.path.join(directory_path, rel_path) if rel_path else directory_path
+                    walked = next(os.walk(root), None)
+                    if walked is None:
+                        continue
+                    _, dirs, files = walked
                     
-                    # Check if file already exists by name and parent
-                    if not FileItem.objects.filter(parent=parent_dir, name=file_name, item_type='file').exists():
-                        # Create FileStorage record
-                        file_info = file_path_manager.get_file_info(file_path)
-                        if file_info:
-                            # Generate UUID filename and copy file
-                            new_uuid_filename = file_path_manager.generate_uuid_filename(file_name)
-                            new_file_path, new_relative_path = file_path_manager.get_upload_path(file_name, rel_path)
-                            
-                            # Copy file to new location
-                            shutil.copy2(file_path, new_file_path)
-                            
-                            # Create FileStorage record
-                            file_storage = FileStorage.objects.create(
-                                original_filename=file_name,
-                                file_path=new_relative_path,
-                                file_size=file_info['size'],
-                                mime_type=file_info['mime_type'],
-                                extension=file_info['extension'],
-                                checksum=''  # Will be calculated below
-                            )
-                            
-                            # Calculate and update checksum
-                            file_storage.checksum = file_storage.calculate_checksum()
-                            file_storage.save()
-                            
-                            # Create FileItem record
-                            file_item = FileItem.objects.create(
-                                name=file_name,
-                                item_type='file',
-                                parent=parent_dir,
-                                storage=file_storage,
+                    # Add directories, inserting the missing ones of this level together
+                    for dir_name in dirs:
+                        directory_id = existing.get((parent_id, dir_name, 'directory'))
+                        existed = directory_id is not None
+                        if not existed:
+                            directory = FileItem(
+                                name=dir_name,
+                                item_type='directory',
+                                parent_id=parent_id,
                                 owner=user
                             )
-                            
-                            scanned_count += 1
-        except Exception as e:
-            print(f'Error scanning directory {directory_path}: {e}')
+                            new_directories.append(directory)
+                            directory_id = directory.id
+                        # Like os.walk, list symlinked directories but don't descend into them
+                        if not os.path.islink(os.path.join(root, dir_name)):
+                            next_level.append((os.path.join(rel_path, dir_name), directory_id, existed))
+                    
+                    # Queue files that aren't in the database yet
+                    for file_name in files:
+                        if (parent_id, file_name, 'file') not in existing:
+                            pending_files.append((parent_id, file_name, os.path.join(root, file_name)))
+                
+                if new_directories:
+                    FileItem.objects.bulk_create(new_directories, batch_size=SCAN_BATCH_SIZE)
+                    # bulk_create skips post_save, so invalidate cached listings explicitly
+                    FileItem.objects.mark_children_changed({directory.parent_id for directory in new_directories})
+                    scanned_count += len(new_directories)
+                
+                level = next_level
+            
+            scanned_count += self._import_scanned_files(pending_files, user)
+        except Exception:
+            logger.exception('Error scanning directory %s', directory_path)
         
         return scanned_count
     
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
+    def _existing_scan_children(self, parent_ids, user):
+        """Map (parent id, name, type) to id for the user's items in the given directories
+        
+        A parent id of None stands for the user's root level.
+        """
+        directory_ids = [parent_id for parent_id in parent_ids if parent_id is not None]
+        lookups = [
+            Q(parent_id__in=directory_ids[start:start + SCAN_BATCH_SIZE])
+            for start in range(0, len(directory_ids), SCAN_BATCH_SIZE)
+        ]
+        if None in parent_ids:
+            lookups.append(Q(parent__isnull=True))
+        
+        existing = {}
+        for lookup in lookups:
+            for parent_id, name, item_type, item_id in FileItem.objects.filter(lookup, owner=user).values_list(
+                'parent_id', 'name', 'item_type', 'id'
+            ):
+                existing[(parent_id, name, item_type)] = item_id
+        return existing
+    
+    def _import_scanned_files(self, pending_files, user):
+        """Copy scanned files into storage in parallel and bulk-create their records
+        
+        A file that fails to copy is logged and skipped. If the import itself is
+        aborted, copies whose records were never committed are removed again.
+        """
+        imported_count = 0
+        batch = []
+        
+        def flush():
+            with transaction.atomic():
+                FileStorage.objects.bulk_create([storage for _, storage in batch])
+                FileItem.objects.bulk_create([
+                    FileItem(
+                        name=storage.original_filename,
+                        item_type='file',
+                        parent_id=parent_id,
+                        storage=storage,
+                        owner=user
+                    )
+                    for parent_id, storage in batch
+                ])
+                # bulk_create skips post_save, so invalidate cached listings explicitly
+                FileItem.objects.mark_children_changed([parent_id for parent_id, _ in batch])
+        
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            futures = {
+                executor.submit(self._prepare_scanned_file, file_name, source_path): (parent_id, source_path)
+                for parent_id, file_name, source_path in pending_files
+            }
+            consumed = set()
+            try:
+                for future in as_completed(futures):
+                    consumed.add(future)
+                    parent_id, source_path = futures[future]
+                    try:
+                        storage = future.result()
+                    except Exception:
+                        # An unreadable or vanished file only skips that file
+                        logger.exception('Skipping scanned file %s', source_path)
+                        continue
+                    if storage is None:
+                        continue
+                    batch.append((parent_id, storage))
+                    if len(batch) >= SCAN_BATCH_SIZE:
+                        flush()
+                        imported_count += len(batch)
+                        batch = []
+                
+                if batch:
+                    flush()
+                    imported_count += len(batch)
+            except BaseException:
+                # Don't leave copies without records: stop queued copies, let the
+                # running ones finish and remove everything that wasn't committed
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                unflushed = [storage for _, storage in batch]
+                for future in futures:
+                    if future not in consumed and not future.cancelled() and future.exception() is None:
+                        unflushed.append(future.result())
+                for storage in unflushed:
+                    if storage is not None:
+                        _remove_file(storage.get_file_path())
+                raise
+        
+        return imported_count
+    
+    def _prepare_scanned_file(self, file_name, source_path):
+        """Copy a scanned file into UUID storage and build its unsaved FileStorage"""
+        file_info = file_path_manager.get_file_info(source_path)
+        if not file_info:
+            return None
+        
+        # Copy file to new location, hashing it on the way
+        new_file_path, _ = file_path_manager.get_upload_path(file_name)
+        try:
+            checksum = copy_and_hash(source_path, new_file_path)
+        except Exception:
+            _remove_file(new_file_path)
+            raise
+        
+        return FileStorage(
+            original_filename=file_name,
+            file_path=os.path.basename(new_file_path),
+            file_size=file_info['size'],
+            mime_type=file_info['mime_type'],
+            extension=file_info['extension'],
+            checksum=checksum
+        )
+    
     @action(detail=True, methods=['post'])
     def share_recursively(self, request, pk=None):
         """Share a directory and all its contents recursively with a user or group"""
@@ -1056,95 +1179,104 @@ class FileItemViewSet(viewsets.ModelViewSet):
         except (UserUUIDMap.DoesNotExist, GroupUUIDMap.DoesNotExist):
             return Response({'error': 'Invalid target_id'}, status=status.HTTP_400_BAD_REQUEST)
         
+        permission_types = list(dict.fromkeys(permission_types))
+        valid_types = {choice for choice, _ in FileAccessPermission.PERMISSION_TYPES}
+        invalid_types = [permission_type for permission_type in permission_types if permission_type not in valid_types]
+        if invalid_types:
+            return Response({'error': f'Invalid permission_types: {invalid_types}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if expires_at:
+            try:
+                expires_at = DateTimeField().to_internal_value(expires_at)
+            except DRFValidationError:
+                return Response({'error': 'Invalid expires_at'}, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
-            # Get all files and subdirectories recursively
-            all_items = self._get_recursive_items(file_item)
+            if share_type == 'user':
+                target = {'user_id': target_pk, 'group_id': None}
+            else:
+                target = {'user_id': None, 'group_id': target_pk}
             
-            # Create permissions for each item
-            created_permissions = []
+            # Commit the whole share at once, so it applies to all items or to none.
+            # The tree is loaded and processed a chunk at a time to bound memory.
+            shared_count = 0
+            total_items = 0
+            changed_parent_ids = set()
+            with transaction.atomic():
+                for items in self._iter_recursive_items(file_item):
+                    shared_count += self._share_item_chunk(
+                        items, permission_types, target, expires_at, request.user
+                    )
+                    total_items += len(items)
+                    changed_parent_ids.update(item.parent_id for item in items)
+                # Bulk writes skip post_save, so invalidate cached listings explicitly
+                FileItem.objects.mark_children_changed(changed_parent_ids)
             failed_items = []
             
-            for item in all_items:
-                try:
-                    # Create permissions for each permission type
-                    for permission_type in permission_types:
-                        permission_data = {
-                            'file': item.id,  # Use ID for serializer
-                            'permission_type': permission_type,
-                            'expires_at': expires_at
-                        }
-                        
-                        if share_type == 'user':
-                            permission_data['user'] = target_pk
-                            permission_data['group'] = None
-                        else:
-                            permission_data['user'] = None
-                            permission_data['group'] = target_pk
-                        
-                        # Check if permission already exists
-                        existing_permission = FileAccessPermission.objects.filter(
-                            file=item,
-                            user=permission_data.get('user'),
-                            group=permission_data.get('group'),
-                            permission_type=permission_type
-                        ).first()
-                        
-                        if existing_permission:
-                            # Update existing permission
-                            existing_permission.expires_at = expires_at
-                            existing_permission.is_active = True
-                            existing_permission.save()
-                            created_permissions.append(existing_permission)
-                        else:
-                            # Create new permission using serializer
-                            serializer = FileAccessPermissionCreateSerializer(data=permission_data, context={'request': request})
-                            if serializer.is_valid():
-                                permission = serializer.save(granted_by=request.user)
-                                created_permissions.append(permission)
-                            else:
-                                failed_items.append({
-                                    'item': item.name,
-                                    'error': f'Serializer validation failed: {serializer.errors}'
-                                })
-                            
-                except Exception as e:
-                    failed_items.append({
-                        'item': item.name,
-                        'error': str(e)
-                    })
-            
             # Log the recursive sharing
-            FileAccessLog.objects.create(
+            enqueue_access_log(
                 file=file_item,
                 user=request.user,
                 action='recursive_share',
-                ip_address=self.get_client_ip(request),
+                ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')
             )
             
             return Response({
-                'message': f'Successfully shared {len(created_permissions)} items',
-                'shared_items_count': len(created_permissions),
+                'message': f'Successfully shared {shared_count} items',
+                'shared_items_count': shared_count,
                 'failed_items': failed_items,
-                'total_items': len(all_items)
+                'total_items': total_items
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
             return Response({'error': f'Failed to share recursively: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _get_recursive_items(self, directory):
-        """Get all files and subdirectories within a directory recursively"""
-        items = [directory]  # Include the directory itself
-        
-        def _traverse(current_dir):
-            children = current_dir.get_children()
-            for child in children:
-                items.append(child)
-                if child.item_type == 'directory':
-                    _traverse(child)
+    def _share_item_chunk(self, items, permission_types, target, expires_at, granted_by):
+        """Grant or reactivate the target's permissions on a chunk of items"""
+        existing_permissions = {
+            (permission.file_id, permission.permission_type): permission
+            for permission in FileAccessPermission.objects.filter(
+                file_id__in=[item.id for item in items],
+                permission_type__in=permission_types,
+                **target
+            )
+        }
         
-        _traverse(directory)
-        return items
+        # Reactivate existing permissions and build the missing ones
+        to_update = []
+        to_create = []
+        for item in items:
+            for permission_type in permission_types:
+                permission = existing_permissions.get((item.id, permission_type))
+                # Bulk writes skip save(), which normally derives the priority
+                priority = FileAccessPermission.PERMISSION_PRIORITY[permission_type]
+                if permission:
+                    permission.expires_at = expires_at
+                    permission.is_active = True
+                    permission.priority = priority
+                    to_update.append(permission)
+                else:
+                    to_create.append(FileAccessPermission(
+                        file_id=item.id,
+                        permission_type=permission_type,
+                        priority=priority,
+                        expires_at=expires_at,
+                        granted_by=granted_by,
+                        **target
+                    ))
+        
+        FileAccessPermission.objects.bulk_update(to_update, ['expires_at', 'is_active', 'priority'], batch_size=1000)
+        FileAccessPermission.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+        # save() would also have updated each item's visibility
+        FileItem.objects.filter(id__in=[item.id for item in items]).sync_visibility_from_sharing()
+        return len(to_update) + len(to_create)
+    
+    def _iter_recursive_items(self, directory):
+        """Yield a directory and everything below it in chunks of at most SHARE_CHUNK_SIZE"""
+        # Include the directory itself
+        yield [directory]
+        yield from FileItem.objects.tree_fields().iter_descendants([directory.id], chunk_size=SHARE_CHUNK_SIZE)
 
     @action(detail=True, methods=['post'])
     def unshare_recursively(self, request, pk=None):
@@ -1170,64 +1302,64 @@ class FileItemViewSet(viewsets.ModelViewSet):
         except (UserUUIDMap.DoesNotExist, GroupUUIDMap.DoesNotExist):
             return Response({'error': 'Invalid target_id'}, status=status.HTTP_400_BAD_REQUEST)
         
+        permission_filter = {'is_active': True}
+        
+        if share_type == 'user':
+            permission_filter['user_id'] = target_pk
+            permission_filter['group__isnull'] = True
+        else:
+            permission_filter['group_id'] = target_pk
+            permission_filter['user__isnull'] = True
+        
+        # Filter by specific permission types if provided
+        if permission_types:
+            permission_filter['permission_type__in'] = permission_types
+        
+        # Skip the tree walk when the target holds no matching permission anywhere
+        if not FileAccessPermission.objects.filter(**permission_filter).exists():
+            return Response({
+                'message': 'No permissions to unshare',
+                'revoked_permissions_count': 0,
+                'failed_items': [],
+                'total_items': 0
+            }, status=status.HTTP_200_OK)
+        
         try:
-            # Get all files and subdirectories recursively
-            all_items = self._get_recursive_items(file_item)
-            
-            # Revoke permissions for each item
-            revoked_permissions = []
+            # Revoke the matching permissions one chunk of the tree at a time, all in
+            # one transaction, so no single file_id IN list grows with the tree
+            revoked_count = 0
+            total_items = 0
+            changed_parent_ids = set()
+            with transaction.atomic():
+                for items in self._iter_recursive_items(file_item):
+                    permissions_to_revoke = FileAccessPermission.objects.filter(
+                        file_id__in=[item.id for item in items], **permission_filter
+                    )
+                    revoked_file_ids = set(permissions_to_revoke.select_for_update().values_list('file_id', flat=True))
+                    if revoked_file_ids:
+                        revoked_count += permissions_to_revoke.update(is_active=False)
+                        # update() skips save(), which would have resynced each item's visibility
+                        FileItem.objects.filter(id__in=revoked_file_ids).sync_visibility_from_sharing()
+                        changed_parent_ids.update(item.parent_id for item in items if item.id in revoked_file_ids)
+                    total_items += len(items)
+                # update() skips post_save, so invalidate cached listings explicitly
+                FileItem.objects.mark_children_changed(changed_parent_ids)
             failed_items = []
             
-            for item in all_items:
-                try:
-                    # Build filter for permissions to revoke
-                    permission_filter = {
-                        'file': item,
-                        'is_active': True
-                    }
-                    
-                    if share_type == 'user':
-                        permission_filter['user_id'] = target_pk
-                        permission_filter['group__isnull'] = True
-                    else:
-                        permission_filter['group_id'] = target_pk
-                        permission_filter['user__isnull'] = True
-                    
-                    # Filter by specific permission types if provided
-                    if permission_types:
-                        permission_filter['permission_type__in'] = permission_types
-
-                    print(f"Permission filter: {permission_filter}")
-                    
-                    # Find and revoke permissions
-                    permissions_to_revoke = FileAccessPermission.objects.filter(**permission_filter)
-                    print(f"Permissions to revoke: {permissions_to_revoke}")
-                    
-                    for permission in permissions_to_revoke:
-                        permission.is_active = False
-                        permission.save()
-                        revoked_permissions.append(permission)
-                        
-                except Exception as e:
-                    failed_items.append({
-                        'item': item.name,
-                        'error': str(e)
-                    })
-            
             # Log the recursive unsharing
-            FileAccessLog.objects.create(
+            enqueue_access_log(
                 file=file_item,
                 user=request.user,
                 action='recursive_unshare',
-                ip_address=self.get_client_ip(request),
+                ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')
             )
             
             return Response({
-                'message': f'Successfully unshared {len(revoked_permissions)} permissions',
-                'revoked_permissions_count': len(revoked_permissions),
+                'message': f'Successfully unshared {revoked_count} permissions',
+                'revoked_permissions_count': revoked_count,
                 'failed_items': failed_items,
-                'total_items': len(all_items)
+                'total_items': total_items
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -1254,11 +1386,11 @@ class FileItemViewSet(viewsets.ModelViewSet):
                 updated_file = serializer.save()
                 
                 # Log the content update
-                FileAccessLog.objects.create(
+                enqueue_access_log(
                     file=updated_file,
                     user=request.user,
                     action='edit',
-                    ip_address=self.get_client_ip(request),
+                    ip_address=get_client_ip(request),
                     user_agent=request.META.get('HTTP_USER_AGENT', '')
                 )
                 
@@ -1316,13 +1448,15 @@ class FileUploadView(generics.CreateAPIView):
             # Get parent directory if specified
             parent_directory = None
             if parent_id:
-                try:
-                    parent_directory = FileItem.objects.get(id=parent_id, item_type='directory')
-                    # Check if user can write to parent directory
-                    if not parent_directory.can_write(request.user):
-                        return Response({'error': 'Access denied to parent directory'}, status=status.HTTP_403_FORBIDDEN)
-                except FileItem.DoesNotExist:
+                parent_directory = FileItem.objects.filter(id=parent_id, item_type='directory').prefetch_related(
+                    'access_permissions', 'shared_users', 'shared_groups'
+                ).first()
+                if parent_directory is None:
                     return Response({'error': 'Parent directory not found'}, status=status.HTTP_404_NOT_FOUND)
+                
+                # Check if user can write to parent directory
+                if not parent_directory.can_write(request.user):
+                    return Response({'error': 'Access denied to parent directory'}, status=status.HTTP_403_FORBIDDEN)
             
             # Handle relative path and create directories if needed
             final_parent_directory = parent_directory
@@ -1342,71 +1476,63 @@ class FileUploadView(generics.CreateAPIView):
             # The file_path field should only contain the filename, not the full relative path
             uuid_filename = os.path.basename(file_path)
             
-            # Save file to destination
-            with open(file_path, 'wb+') as destination:
-                for chunk in uploaded_file.chunks():
-                    destination.write(chunk)
+            # Save file to destination (streamed directly into its final UUID path)
+            checksum = self._save_uploaded_file(uploaded_file, file_path)
             
             # Get file information
             file_info = file_path_manager.get_file_info(file_path)
             
-            # Create FileStorage record
-            file_storage = FileStorage.objects.create(
-                original_filename=uploaded_file.name,
-                file_path=uuid_filename,  # Store only the UUID filename, not the full relative path
-                file_size=file_info['size'],
-                mime_type=file_info['mime_type'],
-                extension=file_info['extension'],
-                checksum=file_info.get('checksum', '')  # Will be calculated below
-            )
-            
-            # Calculate and update checksum
-            file_storage.checksum = file_storage.calculate_checksum()
-            file_storage.save()
-            
             # Determine file visibility and sharing based on parent directory
             file_visibility, file_shared_users, file_shared_groups = determine_file_sharing(
                 final_parent_directory, visibility, shared_users, shared_groups, request.user
             )
             
-            # Create FileItem record
-            file_item = FileItem.objects.create(
-                name=uploaded_file.name,
-                item_type='file',
-                parent=final_parent_directory,
-                storage=file_storage,
-                owner=request.user,
-                visibility=file_visibility
-            )
-            
-            # Generate thumbnail if it's an image
-            if file_info['mime_type'].startswith('image/'):
-                thumbnail = self._generate_thumbnail(file_storage)
-                if thumbnail:
-                    file_item.thumbnail = thumbnail
-                    file_item.save()
-            
-            # Add shared users if visibility is 'user'
-            if file_visibility == 'user' and file_shared_users:
-                users = User.objects.filter(id__in=file_shared_users)
-                file_item.shared_users.set(users)
-            
-            # Add shared groups if visibility is 'group'
-            if file_visibility == 'group' and file_shared_groups:
-                groups = Group.objects.filter(id__in=file_shared_groups)
-                file_item.shared_groups.set(groups)
-            
-            # Add tags
-            for tag_name in tags:
-                tag, created = FileTag.objects.get_or_create(name=tag_name)
-                FileTagRelation.objects.create(file=file_item, tag=tag)
+            try:
+                with transaction.atomic():
+                    # Create FileStorage record with the checksum computed during the write
+                    file_storage = FileStorage.objects.create(
+                        original_filename=uploaded_file.name,
+                        file_path=uuid_filename,  # Store only the UUID filename, not the full relative path
+                        file_size=file_info['size'],
+                        mime_type=file_info['mime_type'],
+                        extension=file_info['extension'],
+                        checksum=checksum,
+                    )
+                    
+                    # Create FileItem record
+                    file_item = FileItem.objects.create(
+                        name=uploaded_file.name,
+                        item_type='file',
+                        parent=final_parent_directory,
+                        storage=file_storage,
+                        owner=request.user,
+                        visibility=file_visibility
+                    )
+                    
+                    # Add shared users if visibility is 'user', shared groups if it is 'group'
+                    if file_visibility == 'user' and file_shared_users:
+                        add_initial_sharing(file_item, user_ids=file_shared_users)
+                    elif file_visibility == 'group' and file_shared_groups:
+                        add_initial_sharing(file_item, group_ids=file_shared_groups)
+                    
+                    # Add tags
+                    self._add_tags(file_item, tags)
+                    
+                    # Generate thumbnail once the records are committed
+                    if file_info['mime_type'].startswith('image/'):
+                        transaction.on_commit(lambda: self._schedule_thumbnail(file_item))
+            except Exception:
+                # Don't leave an orphaned file on disk when the records could not be saved
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                raise
             
             # Log the upload
-            FileAccessLog.objects.create(
+            enqueue_access_log(
                 file=file_item,
                 user=request.user,
                 action='upload',
-                ip_address=self._get_client_ip(request),
+                ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')
             )
             
@@ -1415,6 +1541,84 @@ class FileUploadView(generics.CreateAPIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _save_uploaded_file(self, uploaded_file, file_path):
+        """Write an uploaded file to its storage path and return its SHA256 checksum
+        
+        Uploads spooled to a temporary file are renamed into place when it lives on
+        the same filesystem; everything else is copied with a large buffer and
+        hashed as it is written, so the stored file is never read back.
+        """
+        sha256_hash = hashlib.sha256()
+        uploaded_file.file.seek(0)
+        
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            try:
+                os.rename(uploaded_file.temporary_file_path(), file_path)
+                if settings.FILE_UPLOAD_PERMISSIONS is not None:
+                    os.chmod(file_path, settings.FILE_UPLOAD_PERMISSIONS)
+                # The open temp file handle still reads the renamed data
+                for chunk in iter(lambda: uploaded_file.file.read(UPLOAD_COPY_BUFFER_SIZE), b''):
+                    sha256_hash.update(chunk)
+                return sha256_hash.hexdigest()
+            except OSError:
+                # Different filesystem, fall back to copying
+                uploaded_file.file.seek(0)
+        
+        with open(file_path, 'wb') as destination:
+            for chunk in iter(lambda: uploaded_file.file.read(UPLOAD_COPY_BUFFER_SIZE), b''):
+                sha256_hash.update(chunk)
+                destination.write(chunk)
+        return sha256_hash.hexdigest()
+    
+    def _add_tags(self, file_item, tag_names):
+        """Attach tags to a file, creating missing tags in bulk"""
+        tag_names = list(dict.fromkeys(tag_names))
+        if not tag_names:
+            return
+        
+        tags = list(FileTag.objects.filter(name__in=tag_names))
+        existing_names = {tag.name for tag in tags}
+        missing = [FileTag(name=name) for name in tag_names if name not in existing_names]
+        if missing:
+            FileTag.objects.bulk_create(missing, ignore_conflicts=True)
+            # bulk_create skips post_save, so invalidate cached tag listings explicitly
+            bump_tag_list_version()
+            # ignore_conflicts leaves primary keys unset, so reload the full set
+            tags = FileTag.objects.filter(name__in=tag_names)
+        
+        FileTagRelation.objects.bulk_create(
+            [FileTagRelation(file=file_item, tag=tag) for tag in tags],
+            ignore_conflicts=True
+        )
+        # bulk_create skips post_save, so invalidate cached listings explicitly
+        FileItem.objects.mark_children_changed([file_item.parent_id])
+    
+    def _schedule_thumbnail(self, file_item):
+        """Generate the thumbnail off the request thread unless disabled in settings
+        
+        The item is returned without a thumbnail until the worker attaches it.
+        """
+        if settings.FILE_MANAGER_BACKGROUND_THUMBNAILS:
+            _thumbnail_executor.submit(self._attach_thumbnail_in_background, file_item)
+        else:
+            self._attach_thumbnail(file_item)
+    
+    def _attach_thumbnail_in_background(self, file_item):
+        try:
+            self._attach_thumbnail(file_item)
+        except Exception:
+            logger.warning('Attaching thumbnail failed for %s', file_item.id, exc_info=True)
+        finally:
+            # Worker threads outlive requests, so release their connection explicitly
+            connection.close()
+    
+    def _attach_thumbnail(self, file_item):
+        """Generate and attach a thumbnail for an uploaded image"""
+        thumbnail = self._generate_thumbnail(file_item.storage)
+        if thumbnail:
+            file_item.thumbnail = thumbnail
+            file_item.save(update_fields=['thumbnail'])
+    
     def _generate_thumbnail(self, file_storage):
         """Generate thumbnail for image files"""
         try:
@@ -1424,10 +1628,6 @@ class FileUploadView(generics.CreateAPIView):
             # Open the image
             image_path = file_storage.get_file_path()
             with Image.open(image_path) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
                 # Generate different thumbnail sizes
                 thumbnail_sizes = [
                     ('150x150', 150, 150),
@@ -1438,6 +1638,13 @@ class FileUploadView(generics.CreateAPIView):
                 # Create the first thumbnail (150x150) as default
                 size_name, width, height = thumbnail_sizes[0]
                 
+                # Let JPEG decoding scale down by a power of two up front (no-op for other formats)
+                img.draft('RGB', (width, height))
+                
+                # Convert to RGB if necessary
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGB')
+                
                 # Create thumbnail
                 img.thumbnail((width, height), Image.Resampling.LANCZOS)
                 
@@ -1467,20 +1674,12 @@ class FileUploadView(generics.CreateAPIView):
         except ImportError:
             # PIL not available, skip thumbnail generation
             pass
-        except Exception as e:
+        except Exception:
             # Log error but don't fail the upload
-            print(f"Thumbnail generation failed: {e}")
+            logger.warning('Thumbnail generation failed for %s', file_storage.file_path, exc_info=True)
         
         return None
     
-    def _get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
     def _find_deepest_existing_directory(self, start_parent, path_parts):
         """Find the deepest existing directory in a path without creating anything"""
         current = start_parent
@@ -1503,9 +1702,11 @@ class FileUploadView(generics.CreateAPIView):
     def _get_or_create_directory_path_safe(self, relative_path, parent_directory, user, visibility):
         """Get or create directory path with database-level safety
         
-        This method handles race conditions by using get_or_create with proper
-        error handling. It ensures that multiple concurrent uploads to the same
-        directory path will not create duplicate directories.
+        The existing part of the chain is resolved from a single query. Once a
+        segment is missing, the rest of the path is created one directory at a
+        time through save(), so FileItem.clean() still rejects duplicates, and a
+        directory created by a concurrent upload of the same folder is fetched
+        instead.
         """
         
         if not relative_path:
@@ -1515,54 +1716,39 @@ class FileUploadView(generics.CreateAPIView):
         if not path_parts:
             return parent_directory
         
+        # Resolve the existing part of the chain from a single query
+        candidates = FileItem.objects.filter(
+            name__in=path_parts,
+            item_type='directory',
+            owner=user
+        )
+        directories = {(directory.parent_id, directory.name): directory for directory in candidates}
+        
         current_parent = parent_directory
         
-        for part in path_parts:
-            # Use get_or_create with atomic transaction to prevent race conditions
-            with transaction.atomic():
-                try:
-                    # First try to get existing directory
-                    existing_dir = FileItem.objects.get(
-                        name=part,
-                        parent=current_parent,
-                        item_type='directory',
-                        owner=user,
-                        is_deleted=False
-                    )
-                except FileItem.DoesNotExist:
-                    # Directory doesn't exist, create it
-                    try:
-                        existing_dir = FileItem.objects.create(
-                            name=part,
-                            parent=current_parent,
-                            item_type='directory',
-                            owner=user,
-                            visibility=visibility
-                        )
-                    except ValidationError:
-                        # Another thread created it between our check and create
-                        # Try to get it again
-                        existing_dir = FileItem.objects.get(
-                            name=part,
-                            parent=current_parent,
-                            item_type='directory',
-                            owner=user,
-                            is_deleted=False
-                        )
-                    except IntegrityError:
-                        # Database constraint violation, try to get existing
-                        existing_dir = FileItem.objects.get(
-                            name=part,
-                            parent=current_parent,
-                            item_type='directory',
-                            owner=user,
-                            is_deleted=False
-                        )
-            
+        for depth, part in enumerate(path_parts):
+            current_parent_id = current_parent.id if current_parent else None
+            existing_dir = directories.get((current_parent_id, part))
+            if existing_dir is None:
+                break
             current_parent = existing_dir
+        else:
+            return current_parent
+        
+        for part in path_parts[depth:]:
+            current_parent = self._get_or_create_directory(part, current_parent, user, visibility)
         
         return current_parent
-
+    
+    def _get_or_create_directory(self, name, parent, user, visibility):
+        """Create a directory, or fetch the one another request created first"""
+        lookup = {'name': name, 'parent': parent, 'item_type': 'directory', 'owner': user}
+        try:
+            with transaction.atomic():
+                return FileItem.objects.create(visibility=visibility, **lookup)
+        except (ValidationError, IntegrityError):
+            # Another request created it between our check and create
+            return FileItem.objects.get(**lookup)
 
 class FileOperationView(generics.CreateAPIView):
     """Handle file operations (copy, move, delete)"""
@@ -1580,60 +1766,61 @@ class FileOperationView(generics.CreateAPIView):
         results = []
         
         try:
+            # Load every requested item in one query
+            # with everything the permission checks and copies read
+            items = FileItem.objects.with_deleted().filter(id__in=file_ids).select_related(
+                'storage'
+            ).prefetch_related('access_permissions', 'shared_users', 'shared_groups').in_bulk()
+            
+            # Resolve the destination (and write access to it) once for the whole batch
+            destination_dir, destination_error = None, None
+            if operation in ['copy', 'move']:
+                destination_dir, destination_error = self._resolve_destination(destination_id, request.user)
+                if not destination_error:
+                    # Names already used in the destination, shared by every item in the batch
+                    taken_names = self._get_taken_names(destination_dir)
+            
+            # Validate every item up front so only permitted items reach the handlers
+            runnable = []
             for file_id in file_ids:
-                try:
-                    file_item = FileItem.objects.with_deleted().get(id=file_id)
-                    
-                    # Check permissions
-                    if operation == 'delete' and not file_item.can_delete(request.user):
-                        results.append({
-                            'id': file_id,
-                            'name': file_item.name,
-                            'success': False,
-                            'error': 'Permission denied'
-                        })
-                        continue
-                    elif operation in ['copy', 'move'] and not file_item.can_access(request.user, 'read'):
-                        results.append({
-                            'id': file_id,
-                            'name': file_item.name,
-                            'success': False,
-                            'error': 'Permission denied'
-                        })
-                        continue
-                    
-                    # Check if file is already deleted
-                    if file_item.is_deleted:
-                        results.append({
-                            'id': file_id,
-                            'name': file_item.name,
-                            'success': False,
-                            'error': 'Cannot operate on deleted files'
-                        })
-                        continue
-                    
+                file_item = items.get(file_id)
+                error = self._validate_item(file_item, operation, request.user) or destination_error
+                results.append({
+                    'id': file_id,
+                    'name': file_item.name if file_item else 'Unknown',
+                    'success': error is None,
+                    'error': error
+                })
+                if error is None:
+                    runnable.append((results[-1], file_item))
+            
+            # Copy physical files concurrently before touching the database
+            copied_paths = {}
+            if operation == 'copy':
+                copied_paths = self._copy_storage_files([file_item for _, file_item in runnable])
+            
+            # All items share one commit; each handler runs in its own savepoint
+            copies = []
+            with transaction.atomic():
+                for result, file_item in runnable:
                     # Execute operation
                     if operation == 'delete':
                         success, error = self._soft_delete_file(file_item, request.user)
                     elif operation == 'copy':
-                        success, error = self._copy_file(file_item, destination_id, request.user)
+                        success, error = self._copy_file(
+                            file_item, destination_dir, taken_names, copies, request.user,
+                            copied_paths.get(file_item.id)
+                        )
                     elif operation == 'move':
-                        success, error = self._move_file(file_item, destination_id, request.user)
+                        success, error = self._move_file(file_item, destination_dir, taken_names, request.user)
                     
-                    results.append({
-                        'id': file_id,
+                    result.update({
                         'name': file_item.name,
                         'success': success,
                         'error': error
                     })
-                    
-                except FileItem.DoesNotExist:
-                    results.append({
-                        'id': file_id,
-                        'name': 'Unknown',
-                        'success': False,
-                        'error': 'File not found'
-                    })
+                
+                self._copy_sharing(copies)
             
             return Response({
                 'operation': operation,
@@ -1643,185 +1830,199 @@ class FileOperationView(generics.CreateAPIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _validate_item(self, file_item, operation, user):
+        """Return the reason an item can't take part in the operation, if any"""
+        if file_item is None:
+            return 'File not found'
+        
+        # Check permissions
+        if operation == 'delete' and not file_item.can_delete(user):
+            return 'Permission denied'
+        elif operation in ['copy', 'move'] and not file_item.can_access(user, 'read'):
+            return 'Permission denied'
+        
+        # Check if file is already deleted
+        if file_item.is_deleted:
+            return 'Cannot operate on deleted files'
+        
+        return None
+    
+    def _copy_storage_files(self, file_items):
+        """Copy the stored files of the given items on a thread pool
+        
+        Returns a dict mapping item id to the new file path, or to the exception
+        raised while copying it. Items without readable storage are left out.
+        """
+        sources = {
+            file_item.id: file_item.storage.get_file_path()
+            for file_item in file_items
+            if file_item.item_type == 'file' and file_item.storage
+        }
+        sources = {item_id: path for item_id, path in sources.items() if os.path.exists(path)}
+        if not sources:
+            return {}
+        
+        def copy(source_path):
+            new_file_path, _ = file_path_manager.get_upload_path(os.path.basename(source_path))
+            return copy_file_fast(source_path, new_file_path)
+        
+        copied_paths = {}
+        with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(sources))) as executor:
+            futures = {item_id: executor.submit(copy, path) for item_id, path in sources.items()}
+            for item_id, future in futures.items():
+                try:
+                    copied_paths[item_id] = future.result()
+                except Exception as e:
+                    copied_paths[item_id] = e
+        return copied_paths
+    
+    def _resolve_destination(self, destination_id, user):
+        """Get the destination directory for copy/move, or an error message"""
+        # Handle root directory (destination_id == 0)
+        if destination_id == 0:
+            return None, None
+        
+        # Get destination directory
+        try:
+            destination_dir = FileItem.objects.get(id=destination_id, item_type='directory')
+        except FileItem.DoesNotExist:
+            return None, 'Destination directory not found'
+        
+        # Check if user can write to destination
+        if not destination_dir.can_access(user, 'write'):
+            return None, 'No write permission to destination directory'
+        
+        return destination_dir, None
+    
     def _soft_delete_file(self, file_item, user):
         """Soft delete a file (logical deletion)"""
         try:
-            file_item.soft_delete(user)
+            with transaction.atomic():
+                file_item.soft_delete(user)
             return True, None
         except Exception as e:
             return False, str(e)
     
-    def _copy_file(self, file_item, destination_id, user):
-        """Copy a file to a new destination"""
+    def _copy_file(self, file_item, destination_dir, taken_names, copies, user, new_file_path=None):
+        """Copy a file to a resolved destination directory (None for root)
+        
+        For files, new_file_path is the already-copied physical file (or the
+        exception raised while copying it) from _copy_storage_files.
+        """
         try:
-            # Handle root directory (destination_id == 0)
-            if destination_id == 0:
-                # Copy to root directory
-                destination_dir = None
-                # Generate unique name for root directory first
-                new_name = self._generate_unique_name_root(file_item.name)
-
-            else:
-                # Get destination directory
-                try:
-                    destination_dir = FileItem.objects.get(id=destination_id, item_type='directory')
-                except FileItem.DoesNotExist:
-                    return False, 'Destination directory not found'
-                
-                # Check if user can write to destination
-                if not destination_dir.can_access(user, 'write'):
-                    return False, 'No write permission to destination directory'
-                
+            with transaction.atomic():
                 # Generate new name
-                new_name = self._generate_unique_name(file_item.name, destination_dir)
-            
-            if file_item.item_type == 'file':
-                # For files, we need to copy the physical file and create new storage
-                if not file_item.storage:
-                    return False, 'File storage not found'
-                
-                # Copy physical file with new UUID
-                source_path = file_item.storage.get_file_path()
-                if not os.path.exists(source_path):
-                    return False, 'Source file not found'
+                new_name = self._generate_unique_name(file_item.name, taken_names)
                 
-                # Generate new UUID filename and copy file
-                new_uuid_filename = file_path_manager.generate_uuid_filename(new_name)
-                if destination_dir:
-                    new_file_path, new_relative_path = file_path_manager.get_upload_path(
-                        new_name, destination_dir.get_relative_path()
+                if file_item.item_type == 'file':
+                    # For files, we need the copied physical file and new storage
+                    if not file_item.storage:
+                        return False, 'File storage not found'
+                    
+                    if new_file_path is None:
+                        return False, 'Source file not found'
+                    if isinstance(new_file_path, Exception):
+                        raise new_file_path
+                    
+                    # The copy is byte-identical, so reuse the source metadata instead of re-reading it
+                    source_storage = file_item.storage
+                    new_storage = FileStorage(
+                        original_filename=new_name,
+                        file_path=os.path.basename(new_file_path),  # Storage is flat, keep only the UUID filename
+                        file_size=source_storage.file_size,
+                        mime_type=source_storage.mime_type,
+                        extension=source_storage.extension,
+                        checksum=source_storage.checksum
+                    )
+                    if not new_storage.checksum:
+                        new_storage.checksum = new_storage.calculate_checksum() or ''
+                    new_storage.save()
+                    new_file_item = FileItem.clone_from(
+                        file_item, name=new_name, parent=destination_dir, storage=new_storage, owner=user
+                    )
+                    
+                elif file_item.item_type == 'directory':
+                    # For directories, just create the logical structure
+                    new_file_item = FileItem.clone_from(
+                        file_item, name=new_name, parent=destination_dir, owner=user
                     )
-                else:
-                    new_file_path, new_relative_path = file_path_manager.get_upload_path(new_name, '')
-                
-                shutil.copy2(source_path, new_file_path)
-                
-                # Get file info for new storage
-                file_info = file_path_manager.get_file_info(new_file_path)
-                
-                # Create new FileStorage record
-                new_storage = FileStorage.objects.create(
-                    original_filename=new_name,
-                    file_path=new_relative_path,
-                    file_size=file_info['size'],
-                    mime_type=file_info['mime_type'],
-                    extension=file_info['extension'],
-                    checksum=''  # Will be calculated below
-                )
-                
-                # Calculate and update checksum
-                new_storage.checksum = new_storage.calculate_checksum()
-                new_storage.save()
-                
-                # Create new database record
-                new_file_item = FileItem.objects.create(
-                    name=new_name, 
-                    item_type=file_item.item_type,
-                    parent=destination_dir,
-                    storage=new_storage,
-                    owner=user,
-                    visibility=file_item.visibility
-                )
                 
-                # Copy permissions and sharing
-                new_file_item.shared_users.set(file_item.shared_users.all())
-                new_file_item.shared_groups.set(file_item.shared_groups.all())
+                new_file_item.save()
                 
-            elif file_item.item_type == 'directory':
-                # For directories, just create the logical structure
-                new_file_item = FileItem.objects.create(
-                    name=new_name,
-                    item_type=file_item.item_type,
-                    parent=destination_dir,
-                    owner=user,
-                    visibility=file_item.visibility
-                )
+                # Sharing is copied for the whole batch once all items are done
+                copies.append((new_file_item, file_item))
                 
-                # Copy permissions and sharing
-                new_file_item.shared_users.set(file_item.shared_users.all())
-                new_file_item.shared_groups.set(file_item.shared_groups.all())
-            
             return True, None
             
         except Exception as e:
+            # Don't leave the copied physical file behind when the records were rolled back
+            if isinstance(new_file_path, str) and os.path.exists(new_file_path):
+                os.remove(new_file_path)
             return False, str(e)
     
-    def _move_file(self, file_item, destination_id, user):
-        """Move a file to a new destination"""
+    def _move_file(self, file_item, destination_dir, taken_names, user):
+        """Move a file to a resolved destination directory (None for root)"""
         try:
-            # Handle root directory (destination_id is 0)
-            if destination_id == 0:
-                # Move to root directory
-                destination_dir = None
-                # Generate unique name for root directory first
-                new_name = self._generate_unique_name_root(file_item.name)
-
-
-            else:
-                # Get destination directory
-                try:
-                    destination_dir = FileItem.objects.get(id=destination_id, item_type='directory')
-                except FileItem.DoesNotExist:
-                    return False, 'Destination directory not found'
-                
-                # Check if user can write to destination
-                if not destination_dir.can_access(user, 'write'):
-                    return False, 'No write permission to destination directory'
-                
+            with transaction.atomic():
                 # Check if user can delete from current location
-                if not file_item.can_delete(user):
+                if destination_dir is not None and not file_item.can_delete(user):
                     return False, 'No permission to move file from current location'
                 
                 # Generate new name
-                new_name = self._generate_unique_name(file_item.name, destination_dir)
-            
-            if file_item.item_type == 'file':
-                # For files, we only update the database - no physical file movement
-                # The physical file stays in its original UUID-based location
-                if not file_item.storage:
-                    return False, 'File storage not found'
+                new_name = self._generate_unique_name(file_item.name, taken_names)
+                
+                if file_item.item_type == 'file':
+                    # For files, we only update the database - no physical file movement
+                    # The physical file stays in its original UUID-based location
+                    if not file_item.storage:
+                        return False, 'File storage not found'
+                    
+                    # No physical file movement needed - just update database
+                    pass
+                
+                # Update database record
+                file_item.name = new_name
+                file_item.parent = destination_dir
+                file_item.save()
                 
-                # No physical file movement needed - just update database
-                pass
-            
-            # Update database record
-            file_item.name = new_name
-            file_item.parent = destination_dir
-            file_item.save()
-            
             return True, None
             
         except Exception as e:
             return False, str(e)
     
-    def _generate_unique_name(self, original_name, destination_dir):
-        """Generate a unique name in the destination directory"""
-        base_name, extension = os.path.splitext(original_name)
-        counter = 1
-        new_name = original_name
-        
-        while FileItem.objects.filter(parent=destination_dir, name=new_name).exists():
-            if extension:
-                new_name = f"{base_name} ({counter}){extension}"
-            else:
-                new_name = f"{base_name} ({counter})"
-            counter += 1
-        
-        return new_name
+    def _copy_sharing(self, copies):
+        """Copy shared users and groups from source items to their copies in bulk"""
+        SharedUser = FileItem.shared_users.through
+        SharedGroup = FileItem.shared_groups.through
+        SharedUser.objects.bulk_create([
+            SharedUser(fileitem_id=new_item.id, user_id=user.id)
+            for new_item, source_item in copies
+            for user in source_item.shared_users.all()
+        ], ignore_conflicts=True)
+        SharedGroup.objects.bulk_create([
+            SharedGroup(fileitem_id=new_item.id, group_id=group.id)
+            for new_item, source_item in copies
+            for group in source_item.shared_groups.all()
+        ], ignore_conflicts=True)
+    
+    def _get_taken_names(self, destination_dir):
+        """Get the names already used in a directory (None for root)"""
+        return set(FileItem.objects.filter(parent=destination_dir).values_list('name', flat=True))
     
-    def _generate_unique_name_root(self, original_name):
-        """Generate a unique name in the root directory"""
+    def _generate_unique_name(self, original_name, taken_names):
+        """Generate a name not in taken_names and reserve it"""
         base_name, extension = os.path.splitext(original_name)
         counter = 1
         new_name = original_name
         
-        while FileItem.objects.filter(parent__isnull=True, name=new_name).exists():
+        while new_name in taken_names:
             if extension:
                 new_name = f"{base_name} ({counter}){extension}"
             else:
                 new_name = f"{base_name} ({counter})"
             counter += 1
         
+        taken_names.add(new_name)
         return new_name
 
 
@@ -1829,21 +2030,22 @@ class DeletedFilesViewSet(viewsets.ModelViewSet):
     """ViewSet for managing deleted files"""
     permission_classes = [IsAuthenticated]
     serializer_class = DeletedFileSerializer
+    pagination_class = DeletedFilesPagination
     
     def get_queryset(self):
-        """Only show deleted files"""
-        return FileItem.objects.deleted_only()
-    
-    def list(self, request, *args, **kwargs):
-        """List all deleted files"""
-        queryset = self.get_queryset()
+        """Only show deleted files, limited to the user's own unless superuser
+        
+        The default list action paginates when ?page or ?page_size is given.
+        """
+        queryset = FileItem.objects.deleted_only().select_related(
+            'deleted_by__uuid_map'
+        ).prefetch_related('deleted_by__groups__uuid_map').order_by('name', 'id')
         
         # Filter by owner if not superuser
-        if not request.user.is_superuser:
-            queryset = queryset.filter(owner=request.user)
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(owner=self.request.user)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return queryset
     
     def restore(self, request, *args, **kwargs):
         """Restore deleted files"""
@@ -1851,38 +2053,17 @@ class DeletedFilesViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         file_ids = serializer.validated_data['file_ids']
-        results = []
+        items, results = self._partition_deleted_items(
+            file_ids, request.user, lambda file_item: file_item.can_access(request.user, 'write')
+        )
         
-        for file_id in file_ids:
-            try:
-                file_item = FileItem.objects.deleted_only().get(id=file_id)
-                
-                # Check permissions
-                if not file_item.can_access(request.user, 'write'):
-                    results.append({
-                        'id': file_id,
-                        'name': file_item.name,
-                        'success': False,
-                        'error': 'Permission denied'
-                    })
-                    continue
-                
-                # Restore file
-                file_item.restore()
-                results.append({
-                    'id': file_id,
-                    'name': file_item.name,
-                    'success': True,
-                    'error': None
-                })
-                
-            except FileItem.DoesNotExist:
-                results.append({
-                    'id': file_id,
-                    'name': 'Unknown',
-                    'success': False,
-                    'error': 'File not found'
-                })
+        if items:
+            # Restore all permitted files with a single UPDATE, committed with the cache bump
+            with transaction.atomic():
+                FileItem.objects.deleted_only().filter(id__in=[item.id for item in items]).update(
+                    is_deleted=False, deleted_at=None, deleted_by=None, updated_at=timezone.now()
+                )
+                FileItem.objects.mark_children_changed({item.parent_id for item in items})
         
         return Response({'results': results})
     
@@ -1892,40 +2073,82 @@ class DeletedFilesViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         file_ids = serializer.validated_data['file_ids']
-        results = []
+        items, results = self._partition_deleted_items(
+            file_ids, request.user, lambda file_item: file_item.can_delete(request.user)
+        )
         
+        if items:
+            # Collect storage rows a chunk of the subtree at a time, so no IN list grows with the tree
+            storages = {}
+            for item_ids in self._iter_subtree_ids([item.id for item in items]):
+                storages.update(FileStorage.objects.filter(fileitem__id__in=item_ids).values_list('pk', 'file_path'))
+            storage_ids = list(storages)
+            storage_id_chunks = [
+                storage_ids[start:start + HARD_DELETE_CHUNK_SIZE]
+                for start in range(0, len(storage_ids), HARD_DELETE_CHUNK_SIZE)
+            ]
+            paths = [os.path.join(settings.FILE_MANAGER_ROOT, path) for path in storages.values()]
+            for chunk in storage_id_chunks:
+                paths += [
+                    os.path.join(settings.FILE_MANAGER_ROOT, path)
+                    for path in FileThumbnail.objects.filter(original_file_id__in=chunk).values_list('thumbnail_path', flat=True)
+                ]
+            
+            # Deleting the storage rows cascades to their items and thumbnails
+            with transaction.atomic():
+                for chunk in storage_id_chunks:
+                    FileStorage.objects.filter(pk__in=chunk).delete()
+                FileItem.objects.with_deleted().filter(id__in=[item.id for item in items]).delete()
+            
+            with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+                list(executor.map(_remove_file, paths))
+        
+        return Response({'results': results})
+    
+    def _partition_deleted_items(self, file_ids, user, is_allowed):
+        """Load the requested deleted items in one query and split them by permission"""
+        deleted_items = FileItem.objects.deleted_only().filter(id__in=file_ids)
+        # Superusers pass every check before any relation is read, so skip the prefetch
+        if not user.is_superuser:
+            deleted_items = deleted_items.prefetch_related('access_permissions', 'shared_users', 'shared_groups')
+        deleted_items = deleted_items.in_bulk()
+        
+        items = []
+        results = []
         for file_id in file_ids:
-            try:
-                file_item = FileItem.objects.deleted_only().get(id=file_id)
-                
-                # Check permissions
-                if not file_item.can_delete(request.user):
-                    results.append({
-                        'id': file_id,
-                        'name': file_item.name,
-                        'success': False,
-                        'error': 'Permission denied'
-                    })
-                    continue
-                
-                # Permanently delete file
-                file_item.hard_delete()
+            file_item = deleted_items.get(file_id)
+            if file_item is None:
                 results.append({
                     'id': file_id,
-                    'name': file_item.name,
-                    'success': True,
-                    'error': None
+                    'name': 'Unknown',
+                    'success': False,
+                    'error': 'File not found'
                 })
-                
-            except FileItem.DoesNotExist:
+            elif not is_allowed(file_item):
                 results.append({
                     'id': file_id,
-                    'name': 'Unknown',
+                    'name': file_item.name,
                     'success': False,
-                    'error': 'File not found'
+                    'error': 'Permission denied'
                 })
-        
-        return Response({'results': results})
+            else:
+                items.append(file_item)
+                results.append({
+                    'id': file_id,
+                    'name': file_item.name,
+                    'success': True,
+                    'error': None
+                })
+        return items, results
+    
+    def _iter_subtree_ids(self, root_ids):
+        """Yield the given ids, then the ids below them in chunks of at most HARD_DELETE_CHUNK_SIZE"""
+        yield list(root_ids)
+        descendants = FileItem.objects.with_deleted().tree_fields().iter_descendants(
+            root_ids, chunk_size=HARD_DELETE_CHUNK_SIZE
+        )
+        for chunk in descendants:
+            yield [item.id for item in chunk]
 
 
 class FileAccessPermissionViewSet(viewsets.ModelViewSet):
@@ -1962,33 +2185,47 @@ class FileAccessPermissionViewSet(viewsets.ModelViewSet):
         
         # Users can only see permissions for files they own or have admin access to
         if not user.is_superuser:
-            queryset = queryset.filter(
-                Q(file__owner=user) |  # Own files
-                Q(file__access_permissions__user=user, file__access_permissions__permission_type='admin')  # Admin access
-            ).distinct()
+            queryset = queryset.filter(administered_file_q(user))
         
-        return queryset
+        # Load the users and groups FileAccessPermissionSerializer nests up front
+        return queryset.select_related(
+            'user__uuid_map', 'group__uuid_map', 'granted_by__uuid_map'
+        ).prefetch_related('user__groups__uuid_map', 'granted_by__groups__uuid_map')
+    
+    def create(self, request, *args, **kwargs):
+        """Grant a single permission, or a list of permissions in one request"""
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     def perform_create(self, serializer):
         # Set the user who granted the permission
         serializer.save(granted_by=self.request.user)
         
         # Log the permission grant
-        FileAccessLog.objects.create(
-            file=serializer.instance.file,
-            user=self.request.user,
-            action='permission_granted',
-            ip_address=self._get_client_ip(self.request),
-            user_agent=self.request.META.get('HTTP_USER_AGENT', '')
-        )
+        self._log_permission_grants([serializer.instance])
     
-    def _get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    def perform_bulk_create(self, serializer):
+        """Save a batch of grants atomically and log them once the batch commits"""
+        with transaction.atomic():
+            permissions = serializer.save(granted_by=self.request.user)
+            transaction.on_commit(lambda: self._log_permission_grants(permissions))
+    
+    def _log_permission_grants(self, permissions):
+        ip_address = get_client_ip(self.request)
+        user_agent = self.request.META.get('HTTP_USER_AGENT', '')
+        for permission in permissions:
+            enqueue_access_log(
+                file_id=permission.file_id,
+                user=self.request.user,
+                action='permission_granted',
+                ip_address=ip_address,
+                user_agent=user_agent
+            )
 
 
 class FilePermissionRequestViewSet(viewsets.ModelViewSet):
@@ -2012,11 +2249,14 @@ class FilePermissionRequestViewSet(viewsets.ModelViewSet):
         if not user.is_superuser:
             queryset = queryset.filter(
                 Q(requester=user) |  # Own requests
-                Q(file__owner=user) |  # Own files
-                Q(file__access_permissions__user=user, file__access_permissions__permission_type='admin')  # Admin access
-            ).distinct()
+                administered_file_q(user)  # Own or admin-accessible files
+            )
         
-        return queryset
+        # The serializer nests the full file, so load it the way file listings do
+        return queryset.select_related('requester__uuid_map').prefetch_related(
+            'requester__groups__uuid_map',
+            Prefetch('file', queryset=FileItem.objects.with_deleted().with_related())
+        )
 
 
 class FileTagViewSet(viewsets.ModelViewSet):
@@ -2025,6 +2265,19 @@ class FileTagViewSet(viewsets.ModelViewSet):
     serializer_class = FileTagSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = FileTagPagination
+    
+    def list(self, request, *args, **kwargs):
+        """List tags, cached briefly since they are shared by all users and rarely change
+        
+        The key embeds the tag list version, which tag writes bump, and the full
+        URL so each page and its absolute next/previous links are cached apart.
+        """
+        cache_key = f"filetags:{get_tag_list_version()}:{request.build_absolute_uri()}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, TAG_LIST_CACHE_TIMEOUT)
+        return Response(data)
 
 
 class FileTagRelationViewSet(viewsets.ModelViewSet):
@@ -2047,36 +2300,36 @@ class FileAccessLogViewSet(viewsets.ReadOnlyModelViewSet):
         
         # Users can only see logs for files they own or have admin access to
         if not user.is_superuser:
-            queryset = queryset.filter(
-                Q(file__owner=user) |  # Own files
-                Q(file__access_permissions__user=user, file__access_permissions__permission_type='admin')  # Admin access
-            ).distinct()
+            queryset = queryset.filter(administered_file_q(user))
         
-        # Filter by file
-        file_id = self.request.query_params.get('file', None)
-        if file_id:
-            queryset = queryset.filter(file_id=file_id)
-        
-        # Filter by user
-        user_id = self.request.query_params.get('user', None)
-        if user_id:
-            queryset = queryset.filter(user_id=user_id)
-        
-        # Filter by action
-        action = self.request.query_params.get('action', None)
-        if action:
-            queryset = queryset.filter(action=action)
+        params = self.request.query_params
+        filters = {}
         
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date', None)
-        if start_date:
-            queryset = queryset.filter(timestamp__gte=start_date)
+        # Filter by file, user and action
+        for param, lookup in (('file', 'file_id'), ('user', 'user_id'), ('action', 'action')):
+            value = params.get(param)
+            if value:
+                filters[lookup] = value
         
-        end_date = self.request.query_params.get('end_date', None)
-        if end_date:
-            queryset = queryset.filter(timestamp__lte=end_date)
+        # Filter by date range, parsed once rather than handed to the database as text
+        for param, lookup in (('start_date', 'timestamp__gte'), ('end_date', 'timestamp__lte')):
+            value = params.get(param)
+            if value:
+                filters[lookup] = self._parse_timestamp(param, value)
         
-        return queryset
+        return queryset.filter(**filters).select_related('user__uuid_map').prefetch_related(
+            'user__groups__uuid_map'
+        )
+    
+    def _parse_timestamp(self, param, value):
+        """Parse a date or datetime query parameter into an aware datetime"""
+        try:
+            parsed = FileAccessLog._meta.get_field('timestamp').to_python(value)
+        except ValidationError:
+            raise DRFValidationError({param: f'Invalid date: {value}'})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
 
 
 class UserSearchView(generics.ListAPIView):
@@ -2085,16 +2338,19 @@ class UserSearchView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = User.objects.filter(is_active=True)
-        query = self.request.query_params.get('q', '')
+        query = self.request.query_params.get('q', '').strip()
+        if len(query) < SEARCH_MIN_QUERY_LENGTH:
+            return User.objects.none()
         
-        if query:
-            queryset = queryset.filter(
-                Q(username__icontains=query) |
-                Q(email__icontains=query) |
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query)
-            )
+        queryset = User.objects.filter(is_active=True).filter(
+            Q(username__icontains=query) |
+            Q(email__icontains=query) |
+            Q(first_name__icontains=query) |
+            Q(last_name__icontains=query)
+        ).select_related('uuid_map').only(
+            # Just the columns UserSerializer renders
+            'id', 'username', 'email', 'first_name', 'last_name', 'uuid_map__uuid'
+        ).prefetch_related('groups__uuid_map')
         
         # Limit results for performance
         return queryset[:50]
@@ -2106,11 +2362,13 @@ class GroupSearchView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Group.objects.all()
-        query = self.request.query_params.get('q', '')
+        query = self.request.query_params.get('q', '').strip()
+        if len(query) < SEARCH_MIN_QUERY_LENGTH:
+            return Group.objects.none()
         
-        if query:
-            queryset = queryset.filter(name__icontains=query)
+        queryset = Group.objects.filter(name__icontains=query).select_related('uuid_map').only(
+            'id', 'name', 'uuid_map__uuid'
+        )
         
         # Limit results for performance
         return queryset[:50]